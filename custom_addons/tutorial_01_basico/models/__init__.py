@@ -2,3 +2,4 @@
 # Importa todos los modelos del módulo
 
 from . import libro
+from . import ir_sequence
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Extensión de ir.sequence - Tutorial 01
+
+Reserva de números en bloque: al registrar miles de registros de una vez
+(ej. alta de todos los alumnos al inicio del semestre) se pide un bloque de
+N números en una sola consulta, en lugar de N llamadas a next_by_code.
+"""
+
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_by_code_lote(self, sequence_code, cantidad):
+        """
+        Como next_by_code, pero devuelve una lista con los próximos
+        `cantidad` números ya formateados (prefijo, relleno y sufijo).
+
+        Retorna [] si no existe una secuencia con ese código.
+        """
+        if cantidad <= 0:
+            return []
+        self.check_access_rights('read')
+        # Misma elección que next_by_code: la secuencia de la compañía
+        # actual y, si no tiene, la compartida (company_id NULL va al final)
+        secuencia = self.search(
+            [('code', '=', sequence_code), ('company_id', 'in', [self.env.company.id, False])],
+            order='company_id', limit=1,
+        )
+        if not secuencia:
+            return []
+        return secuencia._next_lote(cantidad)
+
+    def _next_lote(self, cantidad):
+        """
+        Reserva `cantidad` números consecutivos de esta secuencia.
+
+        - Estándar: nextval() sobre generate_series, una sola consulta.
+        - Sin huecos (no_gap): un único UPDATE que avanza number_next en
+          todo el bloque, así la fila de ir_sequence se bloquea una vez y
+          no una vez por número.
+        - Con rangos por fecha: se delega en _next() número por número.
+        """
+        self.ensure_one()
+        if self.use_date_range:
+            return [self._next() for _i in range(cantidad)]
+
+        if self.implementation == 'standard':
+            self._cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % self.id, cantidad],
+            )
+            numeros = sorted(numero for numero, in self._cr.fetchall())
+        else:
+            self.flush_recordset(['number_next', 'number_increment'])
+            self._cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next - number_increment * %s, number_increment
+            """, [cantidad, self.id, cantidad])
+            inicio, incremento = self._cr.fetchone()
+            self.invalidate_recordset(['number_next'])
+            numeros = [inicio + i * incremento for i in range(cantidad)]
+
+        # Mismo formato que get_next_char, calculando el prefijo una sola vez
+        prefijo, sufijo = self._get_prefix_suffix()
+        return [prefijo + '%%0%sd' % self.padding % numero + sufijo for numero in numeros]
@@ -15,6 +15,8 @@ CONCEPTOS CLAVE:
 
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools.sql import create_index, escape_psql
 
 
 class Libro(models.Model):
@@ -34,6 +36,7 @@ class Libro(models.Model):
         descripcion TEXT,
         disponible BOOLEAN DEFAULT true,
         estado VARCHAR(20) DEFAULT 'disponible',
+        active BOOLEAN DEFAULT true,
         create_uid INTEGER REFERENCES res_users(id),
         create_date TIMESTAMP,
         write_uid INTEGER REFERENCES res_users(id),
@@ -58,7 +61,7 @@ class Libro(models.Model):
     name = fields.Char(
         string='Título',  # Etiqueta en la UI
         required=True,  # NOT NULL en SQL
-        index=True,  # Crear índice en BD para búsquedas rápidas
+        # Sin index=True: el índice se crea en init() solo sobre libros activos
         help='Título completo del libro',  # Tooltip de ayuda
     )
 
@@ -119,6 +122,14 @@ class Libro(models.Model):
         required=True,
     )
 
+    # Campo especial 'active': Odoo oculta automáticamente los registros
+    # con active=False en búsquedas, listas y name_search (archivado)
+    active = fields.Boolean(
+        string='Activo',
+        default=True,
+        help='Desmarcar para archivar libros retirados definitivamente del catálogo',
+    )
+
     # Campo Image: para guardar imagen (BYTEA en SQL)
     portada = fields.Image(
         string='Portada',
@@ -149,6 +160,53 @@ class Libro(models.Model):
         ),
     ]
 
+    # =====================================================
+    # ÍNDICES PERSONALIZADOS
+    # =====================================================
+
+    def init(self):
+        """
+        init() se ejecuta al instalar/actualizar el módulo, después de crear
+        la tabla. Sirve para crear índices que no se pueden declarar en los campos.
+
+        Los índices son PARCIALES (WHERE active): los libros archivados no
+        ocupan espacio en ellos, así el catálogo "caliente" sigue siendo pequeño.
+
+        - Título, ISBN y estado: búsquedas y filtros habituales.
+        - Trigram (GIN): acelera ILIKE 'texto%' y '%texto%' sobre título y autor.
+          Requiere la extensión pg_trgm (registry.has_trigram).
+        - varchar_pattern_ops: permite usar el índice en LIKE 'prefijo%' del ISBN.
+          La coincidencia exacta usa el índice de la constraint isbn_unique,
+          que abarca también los archivados para mantener la unicidad.
+        """
+        create_index(self._cr, 'biblioteca_libro_name_activo_idx', self._table,
+                     ['name'], where='active')
+        create_index(self._cr, 'biblioteca_libro_estado_activo_idx', self._table,
+                     ['estado'], where='active')
+        if self.env.registry.has_trigram:
+            create_index(self._cr, 'biblioteca_libro_name_trgm_idx', self._table,
+                         ['(name::text) gin_trgm_ops'], method='gin', where='active')
+            create_index(self._cr, 'biblioteca_libro_autor_trgm_idx', self._table,
+                         ['(autor::text) gin_trgm_ops'], method='gin', where='active')
+        create_index(self._cr, 'biblioteca_libro_isbn_prefix_idx', self._table,
+                     ['isbn varchar_pattern_ops'], where='active')
+
+        # ISBN guardados antes de normalizarse también en write() (o por
+        # importaciones): se normalizan, salvo que el valor ya exista
+        self._cr.execute("""
+            UPDATE biblioteca_libro l
+               SET isbn = n.isbn
+              FROM (
+                    SELECT DISTINCT ON (isbn) id, isbn
+                      FROM (SELECT id, upper(translate(isbn, '- ', '')) AS isbn
+                              FROM biblioteca_libro
+                             WHERE isbn ~ '[- a-z]') sin_normalizar
+                     ORDER BY isbn, id
+              ) n
+             WHERE l.id = n.id
+               AND NOT EXISTS (SELECT 1 FROM biblioteca_libro o WHERE o.isbn = n.isbn)
+        """)
+
     # =====================================================
     # RESTRICCIONES PYTHON (más flexibles)
     # =====================================================
@@ -192,6 +250,21 @@ class Libro(models.Model):
                 'disponible': False,
             })
 
+    def action_archive(self):
+        """
+        Archiva libros retirados (acción estándar "Archivar" del menú Acción).
+
+        Se hace con un único write sobre todo el recordset, por lo que sirve
+        para archivar en lote desde la vista lista.
+        """
+        prestados = self.filtered(lambda l: l.estado in ('prestado', 'reservado'))
+        if prestados:
+            raise ValidationError(
+                'No se pueden archivar libros prestados o reservados: '
+                + ', '.join(prestados.mapped('name'))
+            )
+        return super().action_archive()
+
     def action_marcar_disponible(self):
         """Marca el libro como disponible."""
         for record in self:
@@ -200,6 +273,63 @@ class Libro(models.Model):
                 'disponible': True,
             })
 
+    # =====================================================
+    # BÚSQUEDA POR NOMBRE (autocompletado de Many2one)
+    # =====================================================
+
+    @api.model
+    def _normalizar_isbn(self, valor):
+        """Normaliza un ISBN como create() y write(): mayúsculas, sin guiones ni espacios."""
+        return (valor or '').upper().replace('-', '').replace(' ', '')
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        """
+        Autocompletado de los campos Many2one que apuntan a libros.
+
+        El name_search por defecto hace name ILIKE '%texto%', que no escala
+        con catálogos grandes. Aquí se busca por etapas y en orden de relevancia:
+
+        1. ISBN exacto (índice único de isbn_unique)
+        2. Prefijo de título, autor o ISBN (índices trigram / varchar_pattern_ops)
+        3. Solo si faltan resultados: título o autor que contengan el texto
+
+        El dominio recibido (por ejemplo [('disponible', '=', True)] del campo
+        Prestamo.libro_id) se combina en SQL en cada etapa.
+        """
+        if not name or operator != 'ilike':
+            return super()._name_search(name, domain, operator, limit=limit, order=order)
+
+        domain = domain or []
+        ids = []
+
+        def _buscar(dominio_busqueda):
+            restantes = limit - len(ids) if limit else None
+            if restantes is not None and restantes <= 0:
+                return
+            dominio_final = expression.AND([dominio_busqueda, domain])
+            if ids:
+                dominio_final = expression.AND([dominio_final, [('id', 'not in', ids)]])
+            ids.extend(self._search(dominio_final, limit=restantes, order=order))
+
+        # Solo tiene sentido buscar por ISBN si el texto parece un ISBN
+        isbn = self._normalizar_isbn(name)
+        if not isbn.rstrip('X').isdigit():
+            isbn = False
+
+        if isbn:
+            _buscar([('isbn', '=', isbn)])
+
+        # % y _ escritos por el usuario son texto, no comodines
+        texto = escape_psql(name)
+        prefijo = [('name', '=ilike', f'{texto}%'), ('autor', '=ilike', f'{texto}%')]
+        if isbn:
+            prefijo.append(('isbn', '=like', f'{isbn}%'))
+        _buscar(expression.OR([[hoja] for hoja in prefijo]))
+
+        _buscar(['|', ('name', 'ilike', name), ('autor', 'ilike', name)])
+        return ids
+
     # =====================================================
     # SOBRESCRITURA DE MÉTODOS CRUD
     # =====================================================
@@ -215,7 +345,7 @@ class Libro(models.Model):
         for vals in vals_list:
             # Ejemplo: Convertir ISBN a mayúsculas
             if vals.get('isbn'):
-                vals['isbn'] = vals['isbn'].upper().replace('-', '').replace(' ', '')
+                vals['isbn'] = self._normalizar_isbn(vals['isbn'])
 
         # Llamar al método original
         return super().create(vals_list)
@@ -227,6 +357,10 @@ class Libro(models.Model):
         self: Recordset con los registros a modificar.
         vals: Diccionario con los campos a actualizar.
         """
+        # Mismo formato de ISBN que en create()
+        if vals.get('isbn'):
+            vals['isbn'] = self._normalizar_isbn(vals['isbn'])
+
         # Ejemplo: Si cambia el estado a disponible, actualizar disponible
         if vals.get('estado') == 'disponible':
             vals['disponible'] = True
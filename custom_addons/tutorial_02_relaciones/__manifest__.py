@@ -24,16 +24,27 @@
     'category': 'Tutorial',
 
     # Este módulo depende del módulo anterior
-    'depends': ['tutorial_01_basico'],
+    'depends': ['tutorial_01_basico', 'mail'],
 
     'data': [
         'security/ir.model.access.csv',
         'views/categoria_views.xml',
+        'views/membresia_regla_views.xml',
         'views/miembro_views.xml',
         'views/prestamo_views.xml',
+        'views/reserva_views.xml',
         'views/libro_views_extend.xml',
+        'views/libro_duplicado_views.xml',
+        'views/devolucion_lote_views.xml',
+        'views/inscripcion_lote_views.xml',
+        'views/prestamo_historico_views.xml',
+        'views/recordatorio_views.xml',
+        'views/prestamo_bloqueo_views.xml',
         'views/menu_views.xml',
         'data/categoria_data.xml',
+        'data/membresia_regla_data.xml',
+        'data/mail_template_data.xml',
+        'data/cron_data.xml',
     ],
 
     'application': False,  # Es una extensión, no una app principal
@@ -1,5 +1,15 @@
 # -*- coding: utf-8 -*-
 from . import categoria
+from . import membresia_regla
 from . import miembro
 from . import prestamo
+from . import reserva
 from . import libro
+from . import libro_duplicado
+from . import devolucion_lote
+from . import inscripcion_lote
+from . import res_partner
+from . import prestamo_historico
+from . import prestamo_bloqueo
+from . import prestamo_reporte
+from . import recordatorio
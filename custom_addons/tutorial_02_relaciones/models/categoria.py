@@ -4,9 +4,16 @@ Modelo de Categoría - Tutorial 02
 
 Demuestra el uso de Many2many: una categoría puede tener muchos libros
 y un libro puede pertenecer a muchas categorías.
+
+Las categorías forman un árbol (ej. Literatura > Latinoamericana) guardado
+con parent_path (_parent_store), así un subárbol se busca por prefijo de
+parent_path (child_of usa LIKE 'prefijo%') en lugar de recorrer los hijos
+nivel por nivel.
 """
 
 from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
 
 
 class Categoria(models.Model):
@@ -16,11 +23,20 @@ class Categoria(models.Model):
     RELACIÓN MANY2MANY:
     Una categoría tiene muchos libros, un libro puede estar en muchas categorías.
     Odoo crea automáticamente una tabla intermedia (biblioteca_libro_categoria_rel).
+
+    JERARQUÍA (_parent_store):
+    parent_path guarda los ids de los ancestros ('1/4/9/'). Odoo lo
+    mantiene al crear o mover categorías y lo usa para el operador
+    child_of: ('categoria_ids', 'child_of', id) encuentra los libros de
+    la categoría y de todas sus subcategorías.
     """
 
     _name = 'biblioteca.categoria'
     _description = 'Categoría de Libro'
-    _order = 'name'
+    _order = 'complete_name'
+    _rec_name = 'complete_name'
+    _parent_store = True
+    _parent_name = 'parent_id'
 
     # =====================================================
     # CAMPOS BÁSICOS
@@ -40,6 +56,32 @@ class Categoria(models.Model):
         help='Color para mostrar en vistas kanban',
     )
 
+    # =====================================================
+    # JERARQUÍA
+    # =====================================================
+
+    parent_id = fields.Many2one(
+        comodel_name='biblioteca.categoria',
+        string='Categoría Padre',
+        ondelete='restrict',
+        index=True,
+    )
+
+    child_ids = fields.One2many(
+        comodel_name='biblioteca.categoria',
+        inverse_name='parent_id',
+        string='Subcategorías',
+    )
+
+    parent_path = fields.Char(index=True, unaccent=False)
+
+    complete_name = fields.Char(
+        string='Nombre Completo',
+        compute='_compute_complete_name',
+        recursive=True,
+        store=True,
+    )
+
     # =====================================================
     # RELACIÓN MANY2MANY
     # =====================================================
@@ -63,10 +105,81 @@ class Categoria(models.Model):
         compute='_compute_libro_count',
     )
 
+    # Libros de la categoría y de todas sus subcategorías
+    libro_count_total = fields.Integer(
+        string='Libros (con Subcategorías)',
+        compute='_compute_libro_count_total',
+    )
+
+    def init(self):
+        """
+        Índice para buscar subárboles por prefijo de parent_path
+        (text_pattern_ops: funciona con cualquier collation). Lo usan
+        LIKE 'prefijo%' con prefijo constante (dominio child_of) y los
+        operadores de rango ~>=~ / ~<~ (_compute_libro_count_total).
+        """
+        create_index(self._cr, 'biblioteca_categoria_parent_path_pattern_idx', self._table,
+                     ['parent_path text_pattern_ops'])
+
+    @api.depends('name', 'parent_id.complete_name')
+    def _compute_complete_name(self):
+        for record in self:
+            if record.parent_id:
+                record.complete_name = f'{record.parent_id.complete_name} / {record.name}'
+            else:
+                record.complete_name = record.name
+
     @api.depends('libro_ids')
     def _compute_libro_count(self):
+        """
+        Cuenta los libros de todas las categorías con una sola consulta
+        agrupada sobre biblioteca_libro_categoria_rel, sin cargar los ids
+        de libro_ids de cada categoría.
+        """
+        conteo = dict(self.env['biblioteca.libro']._read_group(
+            [('categoria_ids', 'in', self._origin.ids)],
+            groupby=['categoria_ids'],
+            aggregates=['__count'],
+        ))
+        for record in self:
+            record.libro_count = conteo.get(record._origin, 0)
+
+    @api.depends('libro_ids', 'child_ids')
+    def _compute_libro_count_total(self):
+        """
+        Libros del subárbol de cada categoría, en UNA consulta para todas:
+        cada categoría se une con sus descendientes por prefijo de
+        parent_path. Un libro en varias subcategorías se cuenta una vez.
+
+        El prefijo se expresa como rango [parent_path, parent_path || '~')
+        con los operadores de text_pattern_ops (orden byte a byte; '~' es
+        mayor que los dígitos y '/'): a diferencia de un LIKE con patrón
+        calculado por fila, este rango sí puede usar el índice de init().
+        """
+        ids = self._origin.ids
+        conteo = {}
+        if ids:
+            self.flush_model(['parent_path'])
+            self.env['biblioteca.libro'].flush_model(['categoria_ids', 'active'])
+            self.env.cr.execute("""
+                SELECT c.id, count(DISTINCT r.libro_id)
+                  FROM biblioteca_categoria c
+                  JOIN biblioteca_categoria sub
+                    ON sub.parent_path ~>=~ c.parent_path
+                   AND sub.parent_path ~<~ c.parent_path || '~'
+                  JOIN biblioteca_libro_categoria_rel r ON r.categoria_id = sub.id
+                  JOIN biblioteca_libro l ON l.id = r.libro_id AND l.active
+                 WHERE c.id IN %s
+                 GROUP BY c.id
+            """, [tuple(ids)])
+            conteo = dict(self.env.cr.fetchall())
         for record in self:
-            record.libro_count = len(record.libro_ids)
+            record.libro_count_total = conteo.get(record._origin.id, 0)
+
+    @api.constrains('parent_id')
+    def _check_jerarquia(self):
+        if not self._check_recursion():
+            raise ValidationError('Una categoría no puede ser su propia subcategoría.')
 
     # =====================================================
     # MÉTODOS DE ACCIÓN
@@ -74,7 +187,8 @@ class Categoria(models.Model):
 
     def action_ver_libros(self):
         """
-        Abre una ventana mostrando los libros de esta categoría.
+        Abre una ventana mostrando los libros de esta categoría y de sus
+        subcategorías (operador child_of).
         Retorna una acción que Odoo ejecuta.
         """
         self.ensure_one()  # Asegura que es un solo registro
@@ -83,6 +197,6 @@ class Categoria(models.Model):
             'type': 'ir.actions.act_window',
             'res_model': 'biblioteca.libro',
             'view_mode': 'tree,form',
-            'domain': [('id', 'in', self.libro_ids.ids)],
+            'domain': [('categoria_ids', 'child_of', self.id)],
             'context': {'default_categoria_ids': [(4, self.id)]},
         }
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Asistente de Devolución en Lote - Tutorial 02
+
+Demuestra un TransientModel (asistente/wizard): sus registros son
+temporales y Odoo los borra automáticamente después de un tiempo.
+"""
+
+from odoo import models, fields, Command
+
+
+class DevolucionLote(models.TransientModel):
+    """
+    Puesto de devolución con lector de código de barras.
+
+    El personal escanea todos los libros del carrito (un código por línea)
+    y los préstamos se cierran juntos con una sola llamada al servidor.
+    """
+
+    _name = 'biblioteca.devolucion.lote'
+    _description = 'Devolución de Préstamos en Lote'
+
+    codigos = fields.Text(
+        string='Códigos Escaneados',
+        help='Un ISBN o ID de libro por línea',
+    )
+
+    prestamo_ids = fields.Many2many(
+        comodel_name='biblioteca.prestamo',
+        string='Préstamos Devueltos',
+        readonly=True,
+    )
+
+    no_encontrados = fields.Text(
+        string='Sin Préstamo Activo',
+        readonly=True,
+    )
+
+    repetidos = fields.Text(
+        string='Escaneados Dos Veces',
+        readonly=True,
+    )
+
+    procesado = fields.Boolean(default=False)
+
+    def action_procesar(self):
+        """Devuelve los préstamos escaneados y muestra el resultado."""
+        self.ensure_one()
+        resultado = self.env['biblioteca.prestamo']._devolver_por_escaneo(
+            (self.codigos or '').splitlines()
+        )
+        self.write({
+            'prestamo_ids': [Command.set(resultado['prestamos'].ids)],
+            'no_encontrados': '\n'.join(resultado['no_encontrados']),
+            'repetidos': '\n'.join(resultado['repetidos']),
+            'procesado': True,
+        })
+        # Reabrir el mismo asistente para mostrar el resultado
+        return {
+            'name': 'Devolución en Lote',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
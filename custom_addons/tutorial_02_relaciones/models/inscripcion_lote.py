@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Asistente de Inscripción Masiva - Tutorial 02
+
+Crea miembros para muchos contactos existentes de una vez (ej. todo el
+padrón de alumnos de una escuela), a partir de un dominio o de un CSV.
+"""
+
+import base64
+import csv
+import io
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import SQL, split_every
+from odoo.tools.safe_eval import safe_eval
+
+from .membresia_regla import TIPOS_MEMBRESIA
+
+
+class InscripcionLote(models.TransientModel):
+    """
+    Inscripción masiva de miembros.
+
+    - Los contactos que ya son miembros se descartan con UNA consulta
+      (NOT EXISTS contra biblioteca_miembro), así la constraint
+      partner_unique no hace fallar todo el lote.
+    - Los miembros se crean en lotes grandes (create con vals_list), con
+      los números de carnet reservados en bloque.
+    """
+
+    _name = 'biblioteca.inscripcion.lote'
+    _description = 'Inscripción Masiva de Miembros'
+
+    origen = fields.Selection([
+        ('dominio', 'Filtro de Contactos'),
+        ('csv', 'Archivo CSV'),
+    ], string='Origen', default='dominio', required=True)
+
+    dominio_partner = fields.Char(
+        string='Contactos',
+        default="[('is_company', '=', False)]",
+    )
+
+    archivo = fields.Binary(
+        string='Archivo CSV',
+        help='Columna "id" (ID del contacto) o "email"',
+    )
+    nombre_archivo = fields.Char(string='Nombre del Archivo')
+
+    tipo_membresia = fields.Selection(
+        selection=TIPOS_MEMBRESIA,
+        string='Tipo de Membresía',
+        default='basica',
+        required=True,
+    )
+
+    creados = fields.Integer(string='Miembros Creados', readonly=True)
+    omitidos = fields.Integer(string='Ya Eran Miembros', readonly=True)
+    no_encontrados = fields.Text(string='Filas sin Contacto', readonly=True)
+    procesado = fields.Boolean(default=False)
+
+    # =====================================================
+    # LECTURA DEL ORIGEN
+    # =====================================================
+
+    def _leer_csv(self):
+        """
+        Devuelve (ids de contactos, valores sin contacto) a partir del CSV.
+
+        Los emails se buscan todos juntos y sin distinguir mayúsculas.
+        """
+        if not self.archivo:
+            raise UserError('Seleccione un archivo CSV.')
+        contenido = base64.b64decode(self.archivo).decode('utf-8-sig')
+        filas = list(csv.DictReader(io.StringIO(contenido)))
+        columnas = {c.strip().lower(): c for c in (filas[0].keys() if filas else [])}
+
+        if 'id' in columnas:
+            valores = [fila[columnas['id']].strip() for fila in filas]
+            ids = [int(v) for v in valores if v.isdigit()]
+            existentes = set(self.env['res.partner'].browse(ids).exists().ids)
+            return list(existentes), [v for v in valores if not v.isdigit() or int(v) not in existentes]
+
+        if 'email' in columnas:
+            emails = [fila[columnas['email']].strip().lower() for fila in filas]
+            self.env['res.partner'].flush_model(['email'])
+            self.env.cr.execute(
+                'SELECT lower(email), id FROM res_partner WHERE lower(email) = ANY(%s)',
+                [[e for e in emails if e]],
+            )
+            por_email = dict(self.env.cr.fetchall())
+            return list(set(por_email.values())), [e for e in emails if e not in por_email]
+
+        raise UserError('El CSV debe tener una columna "id" o "email".')
+
+    # =====================================================
+    # INSCRIPCIÓN
+    # =====================================================
+
+    @api.model
+    def _inscribir(self, dominio, tipo_membresia='basica', tamano_lote=1000):
+        """
+        Crea un miembro por cada contacto del dominio que aún no lo sea.
+
+        Retorna {'creados': n, 'omitidos': n}.
+        """
+        Partner = self.env['res.partner']
+        Miembro = self.env['biblioteca.miembro']
+        Miembro.flush_model(['partner_id'])
+
+        # Anti-join: contactos del dominio sin miembro, en una consulta
+        query = Partner._search(dominio)
+        query.add_where(SQL(
+            "NOT EXISTS (SELECT 1 FROM biblioteca_miembro m WHERE m.partner_id = %s)",
+            SQL.identifier(query.table, 'id'),
+        ))
+        self.env.cr.execute(query.select())
+        partner_ids = [row[0] for row in self.env.cr.fetchall()]
+        omitidos = Partner.search_count(dominio) - len(partner_ids)
+
+        for lote in split_every(tamano_lote, partner_ids):
+            Miembro.create([
+                {'partner_id': partner_id, 'tipo_membresia': tipo_membresia}
+                for partner_id in lote
+            ])
+            # Liberar la caché entre lotes (miles de registros en memoria)
+            self.env.flush_all()
+            self.env.invalidate_all()
+
+        return {'creados': len(partner_ids), 'omitidos': omitidos}
+
+    def action_inscribir(self):
+        """Inscribe los contactos y muestra el resultado."""
+        self.ensure_one()
+        no_encontrados = []
+        if self.origen == 'csv':
+            partner_ids, no_encontrados = self._leer_csv()
+            dominio = [('id', 'in', partner_ids)]
+        else:
+            dominio = safe_eval(self.dominio_partner or '[]')
+
+        resultado = self._inscribir(dominio, self.tipo_membresia)
+        self.write({
+            'creados': resultado['creados'],
+            'omitidos': resultado['omitidos'],
+            'no_encontrados': '\n'.join(no_encontrados),
+            'procesado': True,
+        })
+        # Reabrir el mismo asistente para mostrar el resultado
+        return {
+            'name': 'Inscripción Masiva',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
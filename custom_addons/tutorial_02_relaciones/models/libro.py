@@ -6,7 +6,45 @@ Demuestra cómo extender un modelo existente para agregar
 campos y relaciones sin modificar el módulo original.
 """
 
-from odoo import models, fields, api
+import re
+import time
+import unicodedata
+
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from odoo.tools.lru import LRU
+from odoo.tools.sql import create_index
+
+from .prestamo import ESTADOS_ABIERTOS
+from .reserva import ESTADOS_RESERVA_ABIERTOS
+
+
+def normalizar_texto(texto):
+    """
+    Normaliza un texto para comparar títulos/autores entre catálogos:
+    sin acentos, en minúsculas, sin subtítulo (lo que sigue a ':' o ' - ')
+    y sin signos de puntuación.
+    """
+    if not texto:
+        return ''
+    texto = re.split(r':| - ', texto, maxsplit=1)[0]
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^0-9a-z]+', ' ', texto.lower())
+    return ' '.join(texto.split())
+
+
+# Conteos de facetas de las búsquedas recientes: clave -> (expira, facetas)
+CACHE_FACETAS = LRU(256)
+
+# Valor de GROUPING(estado, editorial, decada, disponible) -> faceta
+FACETAS_POR_GRUPO = {
+    0b0111: 'estado',
+    0b1011: 'editorial',
+    0b1101: 'decada',
+    0b1110: 'disponible',
+}
 
 
 class LibroExtension(models.Model):
@@ -45,6 +83,53 @@ class LibroExtension(models.Model):
         string='Historial de Préstamos',
     )
 
+    # Cola de reservas abiertas, en orden de llegada
+    reserva_ids = fields.One2many(
+        comodel_name='biblioteca.reserva',
+        inverse_name='libro_id',
+        string='Cola de Reservas',
+        domain=[('estado', 'in', ('espera', 'disponible'))],
+    )
+
+    # =====================================================
+    # DETECCIÓN DE DUPLICADOS
+    # =====================================================
+
+    # Título + autor normalizados. Se almacena para poder indexarlo
+    # y comparar libros directamente en SQL (ver biblioteca.libro.duplicado)
+    clave_duplicado = fields.Char(
+        string='Clave de Duplicado',
+        compute='_compute_clave_duplicado',
+        store=True,
+    )
+
+    @api.depends('name', 'autor')
+    def _compute_clave_duplicado(self):
+        for record in self:
+            record.clave_duplicado = ' '.join(filter(None, [
+                normalizar_texto(record.name),
+                normalizar_texto(record.autor),
+            ]))
+
+    # Marca que el título/autor cambió y los préstamos aún tienen la copia
+    # anterior (ver Prestamo._cron_sincronizar_copias)
+    copias_pendientes = fields.Boolean(
+        string='Copias Pendientes',
+        copy=False,
+    )
+
+    def init(self):
+        super().init()
+        create_index(self._cr, 'biblioteca_libro_copias_pendientes_idx', self._table,
+                     ['id'], where='copias_pendientes')
+        # Índice trigram para el operador de similitud (%) de pg_trgm
+        if self.env.registry.has_trigram:
+            create_index(self._cr, 'biblioteca_libro_clave_duplicado_trgm_idx', self._table,
+                         ['clave_duplicado gin_trgm_ops'], method='gin')
+        else:
+            create_index(self._cr, 'biblioteca_libro_clave_duplicado_idx', self._table,
+                         ['clave_duplicado'])
+
     # =====================================================
     # CAMPOS CALCULADOS
     # =====================================================
@@ -67,16 +152,42 @@ class LibroExtension(models.Model):
 
     @api.depends('prestamo_ids', 'prestamo_ids.estado')
     def _compute_prestamo_stats(self):
+        """
+        Calcula las estadísticas de todos los libros con dos consultas,
+        sin cargar prestamo_ids en memoria:
+        - Total: agrupado sobre el reporte (préstamos actuales + historial)
+        - Préstamo abierto: índice parcial de libro_prestamo_abierto_unico
+        """
+        libros = self._origin
+        totales = dict(self.env['biblioteca.prestamo.reporte']._read_group(
+            [('libro_id', 'in', libros.ids)],
+            groupby=['libro_id'],
+            aggregates=['__count'],
+        ))
+        abiertos = {
+            prestamo.libro_id: prestamo
+            for prestamo in self.env['biblioteca.prestamo'].search([
+                ('libro_id', 'in', libros.ids),
+                ('estado', 'in', ESTADOS_ABIERTOS),
+            ])
+        }
         for record in self:
-            record.prestamo_count = len(record.prestamo_ids)
-
-            # Buscar préstamo activo
-            prestamo_activo = record.prestamo_ids.filtered(
-                lambda p: p.estado == 'activo'
-            )[:1]  # Tomar el primero si hay varios
+            record.prestamo_count = totales.get(record._origin, 0)
 
+            prestamo_activo = abiertos.get(record._origin, self.env['biblioteca.prestamo'])
             record.prestamo_activo_id = prestamo_activo
-            record.prestado_a = prestamo_activo.miembro_id.name if prestamo_activo else ''
+            record.prestado_a = prestamo_activo.miembro_nombre or ''
+
+    # =====================================================
+    # MÉTODOS CRUD
+    # =====================================================
+
+    def write(self, vals):
+        """Si cambia título o autor, programar la actualización de los préstamos."""
+        if 'name' in vals or 'autor' in vals:
+            vals = dict(vals, copias_pendientes=True)
+            self.env['biblioteca.prestamo']._programar_sincronizacion_copias()
+        return super().write(vals)
 
     # =====================================================
     # MÉTODOS DE ACCIÓN
@@ -95,11 +206,19 @@ class LibroExtension(models.Model):
         }
 
     def action_crear_prestamo(self):
-        """Abre formulario para crear un nuevo préstamo."""
+        """
+        Abre formulario para crear un nuevo préstamo.
+
+        Un libro reservado solo se presta al miembro de la reserva lista
+        para retirar: el formulario se abre con ese miembro.
+        """
         self.ensure_one()
+        context = {'default_libro_id': self.id}
         if not self.disponible:
-            from odoo.exceptions import UserError
-            raise UserError(f'El libro "{self.name}" no está disponible.')
+            reserva = self.reserva_ids.filtered(lambda r: r.estado == 'disponible')[:1]
+            if not reserva:
+                raise UserError(f'El libro "{self.name}" no está disponible.')
+            context['default_miembro_id'] = reserva.miembro_id.id
 
         return {
             'name': 'Nuevo Préstamo',
@@ -107,7 +226,193 @@ class LibroExtension(models.Model):
             'res_model': 'biblioteca.prestamo',
             'view_mode': 'form',
             'target': 'new',  # Abre en ventana modal
-            'context': {
-                'default_libro_id': self.id,
-            },
+            'context': context,
         }
+
+    # =====================================================
+    # FUSIÓN DE DUPLICADOS
+    # =====================================================
+
+    def _fusionar_en(self, destino):
+        """
+        Fusiona los libros de self en destino y los elimina.
+
+        Los préstamos (también los del historial) y las reservas abiertas se
+        reasignan en bloque y las categorías se unen en destino. Otros módulos pueden extender este
+        método para reasignar sus propios registros (ej. inventario en
+        tutorial_03).
+        """
+        destino.ensure_one()
+        origen = self - destino
+        if not origen:
+            return destino
+
+        # Como mucho un préstamo abierto por libro: si varias copias están
+        # prestadas a la vez, no hay cómo unirlas en un solo libro
+        abiertos = self.env['biblioteca.prestamo'].search([
+            ('libro_id', 'in', (origen | destino).ids),
+            ('estado', 'in', ESTADOS_ABIERTOS),
+        ])
+        if len(abiertos) > 1:
+            detalle = ', '.join(f'{p.libro_id.name} ({p.miembro_id.name})' for p in abiertos)
+            raise UserError(
+                f'No se puede fusionar: hay {len(abiertos)} copias prestadas a la vez '
+                f'({detalle}). Registre la devolución de las copias sobrantes y '
+                'vuelva a intentarlo.'
+            )
+
+        prestamos = self.env['biblioteca.prestamo'].search([('libro_id', 'in', origen.ids)])
+        prestamos.write({'libro_id': destino.id})
+
+        # El historial archivado también pasa a destino (libro_id es
+        # ondelete='set null': al borrar origen se perdería el vínculo)
+        Historico = self.env['biblioteca.prestamo.historico']
+        Historico.flush_model(['libro_id'])
+        self.env.cr.execute(
+            "UPDATE biblioteca_prestamo_historico SET libro_id = %s WHERE libro_id IN %s",
+            [destino.id, tuple(origen.ids)],
+        )
+        Historico.invalidate_model(['libro_id'])
+
+        reservas = self._mover_reservas(origen, destino)
+
+        vals = {}
+        categorias = origen.categoria_ids - destino.categoria_ids
+        if categorias:
+            vals['categoria_ids'] = [Command.link(c.id) for c in categorias]
+        if prestamos.filtered(lambda p: p.estado in ESTADOS_ABIERTOS):
+            vals.update(estado='prestado', disponible=False)
+        # Conservar el ISBN si destino no tiene (hay que liberarlo antes por isbn_unique)
+        isbn = not destino.isbn and next((l.isbn for l in origen if l.isbn), False)
+
+        # Sus préstamos ya están en destino: dejar de considerarlos prestados
+        origen.filtered(lambda l: l.estado == 'prestado').write({'estado': 'disponible'})
+        origen.unlink()
+
+        if isbn:
+            vals['isbn'] = isbn
+        if vals:
+            destino.write(vals)
+        if reservas and destino.estado == 'disponible':
+            self.env['biblioteca.reserva']._liberar_libros(destino)
+        return destino
+
+    @api.model
+    def _mover_reservas(self, origen, destino):
+        """
+        Pasa las reservas abiertas de origen a la cola de destino (si no,
+        se borrarían en cascada con el libro).
+
+        La cola sigue ordenada por id, así cada miembro conserva su
+        antigüedad. Las reservas movidas vuelven a 'espera': destino decide
+        a quién le toca. Si un miembro ya estaba en la cola de destino, su
+        reserva repetida se cancela.
+
+        Retorna las reservas movidas.
+        """
+        Reserva = self.env['biblioteca.reserva']
+        reservas = Reserva.search([
+            ('libro_id', 'in', origen.ids),
+            ('estado', 'in', ESTADOS_RESERVA_ABIERTOS),
+        ])
+        en_cola = set(Reserva.search([
+            ('libro_id', '=', destino.id),
+            ('estado', 'in', ESTADOS_RESERVA_ABIERTOS),
+        ]).miembro_id.ids)
+        repetidas = Reserva
+        for reserva in reservas:
+            if reserva.miembro_id.id in en_cola:
+                repetidas |= reserva
+            en_cola.add(reserva.miembro_id.id)
+        repetidas.write({'estado': 'cancelada'})
+        movidas = reservas - repetidas
+        movidas.write({'libro_id': destino.id, 'estado': 'espera', 'fecha_limite': False})
+        return movidas
+
+    # =====================================================
+    # BÚSQUEDA FACETADA (catálogo público)
+    # =====================================================
+
+    @api.model
+    def _buscar_con_facetas(self, domain, offset=0, limit=20, order=None):
+        """
+        Devuelve una página de resultados y los conteos por faceta
+        (categoría, estado, editorial, década y disponible) del dominio.
+
+        Todo sale de UNA consulta: los libros que cumplen el dominio se
+        materializan una vez y sobre ellos se cuentan las facetas con
+        GROUPING SETS; las categorías se cuentan aparte porque un libro
+        puede tener varias. Los conteos se guardan unos segundos
+        (parámetro tutorial_02_relaciones.segundos_cache_facetas) para
+        que las búsquedas frecuentes solo pidan la página.
+
+        Retorna {'total': n, 'libros': recordset, 'facetas': {...}}.
+        """
+        clave = (
+            self.env.cr.dbname, self.env.uid, tuple(self.env.companies.ids),
+            self.env.context.get('active_test', True), repr(domain),
+        )
+        cacheado = CACHE_FACETAS.get(clave)
+        if cacheado and cacheado[0] > time.monotonic():
+            _expira, total, facetas = cacheado
+            libros = self.search(domain, offset=offset, limit=limit, order=order)
+            return {'total': total, 'libros': libros, 'facetas': facetas}
+
+        self.flush_model(['estado', 'editorial', 'fecha_publicacion', 'disponible', 'categoria_ids'])
+        self.env['biblioteca.categoria'].flush_model(['complete_name'])
+
+        pagina = self._search(domain, offset=offset, limit=limit, order=order)
+        todos = self._search(domain)
+        todos.order = None
+        tabla = todos.table
+        self.env.cr.execute(SQL("""
+            WITH hits AS MATERIALIZED (%(hits)s),
+            grupos AS (
+                SELECT GROUPING(estado, editorial, decada, disponible) AS g,
+                       estado, editorial, decada, disponible, count(*) AS n
+                  FROM hits
+                 GROUP BY GROUPING SETS ((estado), (editorial), (decada), (disponible), ())
+            ),
+            categorias AS (
+                SELECT c.id AS valor, c.complete_name AS nombre, count(*) AS n
+                  FROM hits
+                  JOIN biblioteca_libro_categoria_rel r ON r.libro_id = hits.id
+                  JOIN biblioteca_categoria c ON c.id = r.categoria_id
+                 GROUP BY c.id, c.complete_name
+            )
+            SELECT ARRAY(%(pagina)s),
+                   (SELECT json_agg(grupos) FROM grupos),
+                   (SELECT json_agg(categorias) FROM categorias)
+        """,
+            hits=todos.select(
+                SQL('%s AS id', SQL.identifier(tabla, 'id')),
+                SQL('%s AS estado', SQL.identifier(tabla, 'estado')),
+                SQL('%s AS editorial', SQL.identifier(tabla, 'editorial')),
+                SQL('(EXTRACT(YEAR FROM %s)::int / 10) * 10 AS decada',
+                    SQL.identifier(tabla, 'fecha_publicacion')),
+                SQL('COALESCE(%s, false) AS disponible', SQL.identifier(tabla, 'disponible')),
+            ),
+            pagina=pagina.select(),
+        ))
+        ids, grupos, categorias = self.env.cr.fetchone()
+
+        total = 0
+        facetas = {faceta: [] for faceta in FACETAS_POR_GRUPO.values()}
+        for fila in grupos or []:
+            faceta = FACETAS_POR_GRUPO.get(fila['g'])
+            if faceta:
+                facetas[faceta].append({'valor': fila[faceta], 'cantidad': fila['n']})
+            else:
+                total = fila['n']
+        facetas['categoria'] = [
+            {'valor': fila['valor'], 'nombre': fila['nombre'], 'cantidad': fila['n']}
+            for fila in categorias or []
+        ]
+        for valores in facetas.values():
+            valores.sort(key=lambda v: (-v['cantidad'], str(v['valor'])))
+
+        segundos = int(self.env['ir.config_parameter'].sudo().get_param(
+            'tutorial_02_relaciones.segundos_cache_facetas', '60'))
+        if segundos > 0:
+            CACHE_FACETAS[clave] = (time.monotonic() + segundos, total, facetas)
+        return {'total': total, 'libros': self.browse(ids), 'facetas': facetas}
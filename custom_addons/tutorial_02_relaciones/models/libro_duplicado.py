@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo de Posibles Duplicados - Tutorial 02
+
+Al unir catálogos de distintas sucursales aparecen libros casi iguales
+(acentos, subtítulos, ISBN faltante) que la constraint isbn_unique no detecta.
+Este modelo guarda los grupos de candidatos para que el personal los revise
+y los fusione.
+"""
+
+import logging
+
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class LibroDuplicado(models.Model):
+    """
+    Grupo de libros que probablemente son el mismo.
+
+    BÚSQUEDA EN LOTE (_buscar_duplicados):
+    1. Normalización: biblioteca.libro.clave_duplicado (título + autor)
+    2. Bloqueo: solo se comparan pares que el índice trigram considera
+       similares (operador % de pg_trgm), nunca todos contra todos
+    3. Puntuación: similarity() de cada par
+    4. Agrupación: los pares se unen en grupos (union-find)
+    """
+
+    _name = 'biblioteca.libro.duplicado'
+    _description = 'Posible Libro Duplicado'
+    _order = 'similitud desc, id'
+
+    name = fields.Char(
+        string='Descripción',
+        compute='_compute_name',
+    )
+
+    libro_ids = fields.Many2many(
+        comodel_name='biblioteca.libro',
+        relation='biblioteca_libro_duplicado_rel',
+        column1='duplicado_id',
+        column2='libro_id',
+        string='Libros',
+    )
+
+    libro_principal_id = fields.Many2one(
+        comodel_name='biblioteca.libro',
+        string='Libro Principal',
+        ondelete='set null',
+        help='Libro que se conserva al fusionar el grupo',
+    )
+
+    similitud = fields.Float(
+        string='Similitud',
+        digits=(3, 2),
+        help='Similitud mínima entre los pares del grupo (0 a 1)',
+    )
+
+    estado = fields.Selection([
+        ('pendiente', 'Pendiente'),
+        ('fusionado', 'Fusionado'),
+        ('descartado', 'Descartado'),
+    ], string='Estado', default='pendiente', required=True, index=True)
+
+    @api.depends('libro_ids', 'libro_principal_id')
+    def _compute_name(self):
+        for record in self:
+            principal = record.libro_principal_id or record.libro_ids[:1]
+            record.name = f'{principal.name or ""} ({len(record.libro_ids)} libros)'
+
+    # =====================================================
+    # BÚSQUEDA EN LOTE
+    # =====================================================
+
+    @api.model
+    def _buscar_pares(self, umbral):
+        """
+        Devuelve los pares (id_a, id_b, similitud) candidatos a duplicado.
+
+        Con pg_trgm cada libro se compara solo con los que devuelve el índice
+        trigram. Sin pg_trgm se agrupan los libros con clave idéntica.
+        Dos libros con ISBN distinto se consideran ediciones diferentes.
+        Los libros archivados no se proponen (igual que en search()).
+        """
+        libros = self.env['biblioteca.libro']
+        libros.flush_model(['clave_duplicado', 'isbn', 'active'])
+
+        if self.env.registry.has_trigram:
+            self.env.cr.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(umbral)])
+            self.env.cr.execute("""
+                SELECT a.id, b.id, similarity(a.clave_duplicado, b.clave_duplicado)
+                  FROM biblioteca_libro a
+                  JOIN biblioteca_libro b
+                    ON a.clave_duplicado % b.clave_duplicado
+                   AND a.id < b.id
+                 WHERE a.clave_duplicado <> ''
+                   AND a.active AND b.active
+                   AND (a.isbn IS NULL OR b.isbn IS NULL)
+            """)
+            return self.env.cr.fetchall()
+
+        self.env.cr.execute("""
+            SELECT array_agg(id ORDER BY id)
+              FROM biblioteca_libro
+             WHERE clave_duplicado <> '' AND active
+             GROUP BY clave_duplicado
+            HAVING count(*) > 1 AND count(isbn) <= 1
+        """)
+        return [
+            (ids[0], otro, 1.0)
+            for ids, in self.env.cr.fetchall()
+            for otro in ids[1:]
+        ]
+
+    @api.model
+    def _agrupar_pares(self, pares):
+        """Une los pares en grupos disjuntos. Devuelve {raíz: (ids, similitud mínima)}."""
+        padre = {}
+
+        def raiz(x):
+            padre.setdefault(x, x)
+            while padre[x] != x:
+                padre[x] = padre[padre[x]]
+                x = padre[x]
+            return x
+
+        for a, b, _similitud in pares:
+            ra, rb = raiz(a), raiz(b)
+            if ra != rb:
+                padre[max(ra, rb)] = min(ra, rb)
+
+        grupos = {}
+        for a, b, similitud in pares:
+            ids, minima = grupos.get(raiz(a), (set(), 1.0))
+            ids.update((a, b))
+            grupos[raiz(a)] = (ids, min(minima, similitud))
+        return grupos
+
+    @api.model
+    def _buscar_duplicados(self):
+        """
+        Recalcula los grupos de duplicados pendientes de revisión.
+
+        Los grupos descartados se respetan: si un grupo nuevo tiene
+        exactamente los mismos libros, no se vuelve a proponer.
+        """
+        umbral = float(self.env['ir.config_parameter'].sudo().get_param(
+            'tutorial_02_relaciones.umbral_duplicados', '0.6'))
+
+        pares = self._buscar_pares(umbral)
+        grupos = self._agrupar_pares(pares)
+
+        self.search([('estado', '=', 'pendiente')]).unlink()
+        descartados = {
+            frozenset(grupo.libro_ids.ids)
+            for grupo in self.search([('estado', '=', 'descartado')])
+        }
+
+        # Un solo read para elegir el principal de todos los grupos
+        todos_ids = set().union(*(ids for ids, _s in grupos.values()))
+        con_isbn = set(self.env['biblioteca.libro'].search([
+            ('id', 'in', list(todos_ids)),
+            ('isbn', '!=', False),
+        ]).ids)
+
+        vals_list = []
+        for ids, similitud in grupos.values():
+            if frozenset(ids) in descartados:
+                continue
+            # Preferir el libro con ISBN; si no, el más antiguo
+            principal = min(ids, key=lambda i: (i not in con_isbn, i))
+            vals_list.append({
+                'libro_ids': [Command.set(sorted(ids))],
+                'libro_principal_id': principal,
+                'similitud': similitud,
+            })
+
+        _logger.info('Duplicados: %s pares candidatos, %s grupos nuevos', len(pares), len(vals_list))
+        return self.create(vals_list)
+
+    # =====================================================
+    # MÉTODOS DE ACCIÓN
+    # =====================================================
+
+    def action_buscar_duplicados(self):
+        """Ejecuta la búsqueda y abre los grupos encontrados."""
+        self._buscar_duplicados()
+        return {
+            'name': 'Posibles Duplicados',
+            'type': 'ir.actions.act_window',
+            'res_model': 'biblioteca.libro.duplicado',
+            'view_mode': 'tree,form',
+            'domain': [('estado', '=', 'pendiente')],
+        }
+
+    def action_fusionar(self):
+        """Fusiona cada grupo en su libro principal."""
+        for record in self:
+            if record.estado != 'pendiente':
+                raise UserError('Solo se pueden fusionar grupos pendientes.')
+            principal = record.libro_principal_id
+            if not principal or principal not in record.libro_ids:
+                raise UserError('Seleccione un libro principal que pertenezca al grupo.')
+            record.libro_ids._fusionar_en(principal)
+            record.write({'estado': 'fusionado'})
+
+    def action_descartar(self):
+        """Marca los grupos como falsos positivos."""
+        self.write({'estado': 'descartado'})
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Reglas por Tipo de Membresía - Tutorial 02
+
+Parámetros de negocio que dependen del tipo de membresía del miembro
+(los mismos tipos que biblioteca.socio en tutorial_04).
+"""
+
+from odoo import models, fields
+
+# Tipos de membresía (mismas claves que biblioteca.socio.tipo_membresia)
+TIPOS_MEMBRESIA = [
+    ('basica', 'Básica'),
+    ('premium', 'Premium'),
+    ('vip', 'VIP'),
+]
+
+
+class MembresiaRegla(models.Model):
+    """
+    Una regla por tipo de membresía.
+
+    Se consulta desde SQL (ej. Prestamo._calcular_multas hace JOIN con
+    esta tabla), por eso cada valor es una columna simple.
+    """
+
+    _name = 'biblioteca.membresia.regla'
+    _description = 'Regla por Tipo de Membresía'
+    _order = 'tipo_membresia'
+    _rec_name = 'tipo_membresia'
+
+    tipo_membresia = fields.Selection(
+        selection=TIPOS_MEMBRESIA,
+        string='Tipo de Membresía',
+        required=True,
+    )
+
+    # =====================================================
+    # MULTAS
+    # =====================================================
+
+    tarifa_diaria = fields.Float(
+        string='Multa por Día',
+        digits=(10, 2),
+        default=0.0,
+    )
+
+    dias_gracia = fields.Integer(
+        string='Días de Gracia',
+        default=0,
+        help='Días de retraso que no generan multa',
+    )
+
+    multa_maxima = fields.Float(
+        string='Multa Máxima',
+        digits=(10, 2),
+        default=0.0,
+        help='Tope de multa por préstamo (0 = sin tope)',
+    )
+
+    # =====================================================
+    # PRÉSTAMOS
+    # =====================================================
+
+    max_prestamos_activos = fields.Integer(
+        string='Préstamos Simultáneos',
+        default=5,
+        help='Máximo de préstamos abiertos (activos o vencidos) por miembro',
+    )
+
+    # =====================================================
+    # RENOVACIONES
+    # =====================================================
+
+    max_renovaciones = fields.Integer(
+        string='Renovaciones Máximas',
+        default=2,
+        help='Cuántas veces se puede renovar un mismo préstamo',
+    )
+
+    _sql_constraints = [
+        ('tipo_unique', 'UNIQUE(tipo_membresia)',
+         'Ya existe una regla para este tipo de membresía.'),
+        ('valores_positivos',
+         'CHECK(tarifa_diaria >= 0 AND dias_gracia >= 0 AND multa_maxima >= 0 '
+         'AND max_renovaciones >= 0 AND max_prestamos_activos >= 0)',
+         'Los valores de la regla no pueden ser negativos.'),
+    ]
@@ -5,10 +5,35 @@ Modelo de Miembro - Tutorial 02
 Demuestra el uso de Many2one (herencia) y One2many.
 """
 
+import logging
+import threading
+from collections import Counter
+
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+from odoo.tools.sql import create_index, table_exists
 from dateutil.relativedelta import relativedelta
 
+from .membresia_regla import TIPOS_MEMBRESIA
+from .prestamo import ESTADOS_ABIERTOS
+
+_logger = logging.getLogger(__name__)
+
+# Máximo de préstamos abiertos (activos o vencidos) por miembro, si el
+# tipo de membresía no tiene regla (ver biblioteca.membresia.regla)
+LIMITE_PRESTAMOS_ACTIVOS = 5
+
+
+def normalizar_email(valor):
+    """Email en minúsculas y sin espacios (clave de búsqueda)."""
+    return (valor or '').strip().lower()
+
+
+def normalizar_telefono(valor):
+    """Solo los dígitos del teléfono (clave de búsqueda)."""
+    return ''.join(c for c in (valor or '') if c.isdigit())
+
 
 class Miembro(models.Model):
     """
@@ -25,6 +50,8 @@ class Miembro(models.Model):
     _name = 'biblioteca.miembro'
     _description = 'Miembro de Biblioteca'
     _order = 'name'
+    # name_search también encuentra por carnet y email
+    _rec_names_search = ['name', 'numero_carnet', 'email_normalizado']
 
     # =====================================================
     # RELACIÓN MANY2ONE
@@ -68,6 +95,20 @@ class Miembro(models.Model):
         readonly=False,
     )
 
+    # Claves normalizadas e indexadas para identificar al miembro en el
+    # mostrador (ver _buscar_por_escaneo)
+    email_normalizado = fields.Char(
+        compute='_compute_claves_busqueda',
+        store=True,
+        index=True,
+    )
+
+    telefono_normalizado = fields.Char(
+        compute='_compute_claves_busqueda',
+        store=True,
+        index=True,
+    )
+
     # =====================================================
     # CAMPOS PROPIOS DEL MIEMBRO
     # =====================================================
@@ -85,6 +126,9 @@ class Miembro(models.Model):
         required=True,
     )
 
+    # Almacenada e indexada (índice parcial sobre miembros activos, ver
+    # init): "vencen este mes" y el dominio de miembro_id en préstamos
+    # se resuelven en SQL
     fecha_vencimiento = fields.Date(
         string='Fecha de Vencimiento',
         compute='_compute_fecha_vencimiento',
@@ -96,10 +140,37 @@ class Miembro(models.Model):
         default=True,
     )
 
+    tipo_membresia = fields.Selection(
+        selection=TIPOS_MEMBRESIA,
+        string='Tipo de Membresía',
+        default='basica',
+        required=True,
+    )
+
+    # =====================================================
+    # MULTAS
+    # =====================================================
+
+    # Saldo mantenido de forma incremental por Prestamo._calcular_multas:
+    # no se vuelve a sumar las multas de todos los préstamos en cada lectura
+    saldo_multas = fields.Float(
+        string='Saldo de Multas',
+        digits=(10, 2),
+        readonly=True,
+        default=0.0,
+    )
+
     notas = fields.Text(
         string='Notas',
     )
 
+    # Marca que nombre/email cambió y los préstamos aún tienen la copia
+    # anterior (ver Prestamo._cron_sincronizar_copias)
+    copias_pendientes = fields.Boolean(
+        string='Copias Pendientes',
+        copy=False,
+    )
+
     # =====================================================
     # RELACIÓN ONE2MANY
     # =====================================================
@@ -113,19 +184,31 @@ class Miembro(models.Model):
     )
 
     # =====================================================
-    # CAMPOS CALCULADOS
+    # CONTADORES MANTENIDOS
     # =====================================================
 
+    # No son campos calculados: el préstamo los ajusta con una suma en SQL
+    # al crearse, cambiar de estado o eliminarse (_ajustar_contadores), así
+    # una lista de miembros no carga el historial de préstamos de cada uno.
+    # _reconstruir_contadores los recalcula desde cero.
     prestamo_count = fields.Integer(
         string='Cantidad de Préstamos',
-        compute='_compute_prestamo_count',
+        readonly=True,
+        help='Incluye los préstamos movidos al historial',
     )
 
     prestamos_activos = fields.Integer(
         string='Préstamos Activos',
-        compute='_compute_prestamo_count',
+        readonly=True,
+        help='Préstamos abiertos (activos o vencidos)',
     )
 
+    @api.depends('partner_id.email', 'partner_id.phone')
+    def _compute_claves_busqueda(self):
+        for record in self:
+            record.email_normalizado = normalizar_email(record.partner_id.email) or False
+            record.telefono_normalizado = normalizar_telefono(record.partner_id.phone) or False
+
     @api.depends('fecha_registro')
     def _compute_fecha_vencimiento(self):
         for record in self:
@@ -135,29 +218,223 @@ class Miembro(models.Model):
             else:
                 record.fecha_vencimiento = False
 
-    @api.depends('prestamo_ids', 'prestamo_ids.estado')
-    def _compute_prestamo_count(self):
-        for record in self:
-            record.prestamo_count = len(record.prestamo_ids)
-            record.prestamos_activos = len(record.prestamo_ids.filtered(
-                lambda p: p.estado == 'activo'
-            ))
-
     # =====================================================
     # MÉTODOS CRUD
     # =====================================================
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('numero_carnet', 'Nuevo') == 'Nuevo':
-                # Generar número de carnet secuencial
-                vals['numero_carnet'] = self.env['ir.sequence'].next_by_code(
-                    'biblioteca.miembro.carnet'
-                ) or 'MBR-0001'
+        # Reservar todos los números de carnet del lote en una sola llamada
+        nuevos = [vals for vals in vals_list if vals.get('numero_carnet', 'Nuevo') == 'Nuevo']
+        numeros = self.env['ir.sequence']._next_by_code_lote(
+            'biblioteca.miembro.carnet', len(nuevos)
+        )
+        if len(numeros) < len(nuevos):
+            # Un número fijo de respaldo repetiría el carnet en todo el lote
+            raise UserError(
+                'No existe la secuencia de carnets (biblioteca.miembro.carnet). '
+                'Actualice el módulo para volver a crearla.'
+            )
+        for vals, numero in zip(nuevos, numeros):
+            vals['numero_carnet'] = numero
 
         return super().create(vals_list)
 
+    def init(self):
+        """
+        - Índice parcial de vencimiento de los miembros activos.
+        - Calcula los contadores de los miembros que aún no los tienen.
+        """
+        create_index(self._cr, 'biblioteca_miembro_activo_vencimiento_idx', self._table,
+                     ['fecha_vencimiento'], where='activo')
+        if not table_exists(self._cr, 'biblioteca_prestamo'):
+            return  # Instalación nueva: no hay préstamos que contar
+        self._cr.execute('SELECT id FROM biblioteca_miembro WHERE prestamo_count IS NULL')
+        ids = [row[0] for row in self._cr.fetchall()]
+        if ids:
+            self._reconstruir_contadores(self.browse(ids))
+
+    def write(self, vals):
+        # Cambiar de contacto cambia el nombre/email copiado en los préstamos
+        if 'partner_id' in vals:
+            vals = dict(vals, copias_pendientes=True)
+            self.env['biblioteca.prestamo']._programar_sincronizacion_copias()
+        return super().write(vals)
+
+    # =====================================================
+    # MOSTRADOR
+    # =====================================================
+
+    @api.model
+    def _buscar_por_escaneo(self, codigo):
+        """
+        Identifica al miembro a partir de lo que se escanea o tipea en el
+        mostrador: número de carnet, email o teléfono.
+
+        Una sola búsqueda sobre claves normalizadas e indexadas
+        (numero_carnet, email_normalizado, telefono_normalizado). La
+        respuesta incluye los préstamos abiertos y el estado del límite,
+        para que el préstamo empiece con una sola llamada al servidor.
+        """
+        codigo = (codigo or '').strip()
+        if not codigo:
+            return {'encontrado': False, 'coincidencias': []}
+
+        dominio = [('numero_carnet', '=', codigo.upper())]
+        if '@' in codigo:
+            dominio = ['|'] + dominio + [('email_normalizado', '=', normalizar_email(codigo))]
+        telefono = normalizar_telefono(codigo)
+        if len(telefono) >= 6:
+            dominio = ['|'] + dominio + [('telefono_normalizado', '=', telefono)]
+
+        miembros = self.search(dominio, limit=10)
+        if len(miembros) > 1:
+            # El carnet es único: si coincide tiene prioridad
+            por_carnet = miembros.filtered(lambda m: m.numero_carnet == codigo.upper())
+            miembros = por_carnet or miembros
+        if len(miembros) != 1:
+            return {
+                'encontrado': False,
+                'coincidencias': [
+                    {'id': m.id, 'name': m.name, 'numero_carnet': m.numero_carnet}
+                    for m in miembros
+                ],
+            }
+        return {'encontrado': True, **miembros._datos_mostrador()}
+
+    def _datos_mostrador(self):
+        """Miembro, préstamos abiertos y estado del límite, como diccionario."""
+        self.ensure_one()
+        hoy = fields.Date.context_today(self)
+        limite = self._limite_prestamos()[self.id]
+        vigente = self.activo and bool(self.fecha_vencimiento) and self.fecha_vencimiento >= hoy
+        prestamos = self.env['biblioteca.prestamo'].search([
+            ('miembro_id', '=', self.id),
+            ('estado', 'in', ESTADOS_ABIERTOS),
+        ], order='fecha_devolucion_esperada')
+        return {
+            'miembro': {
+                'id': self.id,
+                'numero_carnet': self.numero_carnet,
+                'name': self.name,
+                'email': self.email,
+                'phone': self.phone,
+                'tipo_membresia': self.tipo_membresia,
+                'fecha_vencimiento': str(self.fecha_vencimiento) if self.fecha_vencimiento else None,
+                'vigente': vigente,
+                'saldo_multas': self.saldo_multas,
+            },
+            'limite': {
+                'prestamos_activos': self.prestamos_activos,
+                'maximo': limite,
+                'disponibles': max(limite - self.prestamos_activos, 0),
+                'puede_prestar': vigente and self.prestamos_activos < limite,
+            },
+            'prestamos': [{
+                'id': prestamo.id,
+                'libro_id': prestamo.libro_id.id,
+                'libro_titulo': prestamo.libro_titulo,
+                'fecha_devolucion_esperada': str(prestamo.fecha_devolucion_esperada),
+                'dias_retraso': prestamo.dias_retraso,
+                'estado': prestamo.estado,
+            } for prestamo in prestamos],
+        }
+
+    # =====================================================
+    # CRON JOB
+    # =====================================================
+
+    @api.model
+    def _cron_desactivar_vencidos(self, tamano_lote=1000):
+        """
+        Marca como inactivos (activo = False) los miembros con la membresía
+        vencida.
+
+        Por lotes sobre el índice parcial de vencimiento, con commit entre
+        lotes. Es reanudable: los miembros ya desactivados dejan de cumplir
+        el dominio.
+
+        Retorna la cantidad de miembros desactivados.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        hoy = fields.Date.context_today(self)
+        total = 0
+        while True:
+            lote = self.search([
+                ('activo', '=', True),
+                ('fecha_vencimiento', '<', hoy),
+            ], limit=tamano_lote, order='fecha_vencimiento, id')
+            if not lote:
+                break
+            lote.write({'activo': False})
+            total += len(lote)
+            if auto_commit:
+                self.env.cr.commit()
+            if len(lote) < tamano_lote:
+                break
+        _logger.info('Membresías vencidas desactivadas: %s', total)
+        return total
+
+    # =====================================================
+    # CONTADORES
+    # =====================================================
+
+    @api.model
+    def _ajustar_contadores(self, total, activos):
+        """
+        Suma diferencias a los contadores en una sola sentencia SQL.
+
+        total, activos: Counter {miembro_id: diferencia}. La suma se hace
+        en la base de datos (contador = contador + diferencia), así dos
+        préstamos simultáneos del mismo miembro no se pisan.
+        """
+        ids = [mid for mid in set(total) | set(activos) if mid and (total[mid] or activos[mid])]
+        if not ids:
+            return
+        self.env.cr.execute("""
+            UPDATE biblioteca_miembro m
+               SET prestamo_count = COALESCE(m.prestamo_count, 0) + d.total,
+                   prestamos_activos = COALESCE(m.prestamos_activos, 0) + d.activos
+              FROM unnest(%s::int[], %s::int[], %s::int[]) AS d(id, total, activos)
+             WHERE m.id = d.id
+        """, [ids, [total[mid] for mid in ids], [activos[mid] for mid in ids]])
+        self.browse(ids).invalidate_recordset(['prestamo_count', 'prestamos_activos'])
+
+    @api.model
+    def _reconstruir_contadores(self, miembros=None, tamano_lote=1000):
+        """
+        Recalcula los contadores desde cero, por lotes de miembros.
+
+        Tres consultas agrupadas (_read_group) por lote: préstamos actuales,
+        historial y préstamos abiertos. El historial se omite si su tabla
+        todavía no existe (init() de este modelo corre antes que el del
+        historial al actualizar el módulo).
+        """
+        miembros = miembros if miembros is not None else self.search([])
+        Prestamo = self.env['biblioteca.prestamo']
+        Historico = self.env['biblioteca.prestamo.historico']
+        modelos = [Prestamo]
+        if table_exists(self._cr, Historico._table):
+            modelos.append(Historico)
+        for lote in split_every(tamano_lote, miembros.ids):
+            dominio = [('miembro_id', 'in', list(lote))]
+            total = Counter()
+            for modelo in modelos:
+                for miembro, cantidad in modelo._read_group(dominio, ['miembro_id'], ['__count']):
+                    total[miembro.id] += cantidad
+            activos = {
+                miembro.id: cantidad
+                for miembro, cantidad in Prestamo._read_group(
+                    dominio + [('estado', 'in', ESTADOS_ABIERTOS)], ['miembro_id'], ['__count'])
+            }
+            self.env.cr.execute("""
+                UPDATE biblioteca_miembro m
+                   SET prestamo_count = d.total, prestamos_activos = d.activos
+                  FROM unnest(%s::int[], %s::int[], %s::int[]) AS d(id, total, activos)
+                 WHERE m.id = d.id
+            """, [list(lote), [total[mid] for mid in lote], [activos.get(mid, 0) for mid in lote]])
+        self.invalidate_model(['prestamo_count', 'prestamos_activos'])
+
     # =====================================================
     # RESTRICCIONES
     # =====================================================
@@ -169,13 +446,66 @@ class Miembro(models.Model):
          'El número de carnet debe ser único.'),
     ]
 
-    @api.constrains('prestamo_ids')
+    def _limite_prestamos(self):
+        """Límite de préstamos abiertos de cada miembro: {miembro_id: límite}."""
+        reglas = {
+            regla.tipo_membresia: regla.max_prestamos_activos
+            for regla in self.env['biblioteca.membresia.regla'].search([])
+        }
+        return {
+            record.id: reglas.get(record.tipo_membresia, LIMITE_PRESTAMOS_ACTIVOS)
+            for record in self
+        }
+
+    @api.constrains('prestamo_ids', 'tipo_membresia')
     def _check_prestamos_limite(self):
-        """Un miembro no puede tener más de 5 préstamos activos."""
+        """Un miembro no puede superar el límite de préstamos de su membresía."""
+        limites = self._limite_prestamos()
         for record in self:
-            if record.prestamos_activos > 5:
+            if record.prestamos_activos > limites[record.id]:
                 raise ValidationError(
-                    f'El miembro {record.name} ya tiene 5 préstamos activos. '
+                    f'El miembro {record.name} ya tiene {limites[record.id]} préstamos activos. '
+                    'No puede solicitar más libros.'
+                )
+
+    @api.model
+    def _check_limite_nuevos_prestamos(self, nuevos):
+        """
+        Verifica el límite de préstamos para un lote de préstamos nuevos.
+
+        nuevos: Counter {miembro_id: cantidad de préstamos nuevos}.
+
+        Se llama al prestar, antes de crear los préstamos. Bloquea las filas
+        de los miembros (FOR UPDATE, en orden de id) y lee en la misma
+        consulta si la membresía está vigente, el contador prestamos_activos
+        y el límite de la membresía:
+        dos mostradores que prestan al mismo miembro a la vez se ordenan
+        en este punto. Si el otro ya confirmó y cambió el contador,
+        PostgreSQL reporta un error de serialización y Odoo repite la
+        petición, que vuelve a verificar con el contador actualizado.
+        """
+        if not nuevos:
+            return
+        self.flush_model(['tipo_membresia', 'activo', 'fecha_vencimiento'])
+        self.env.cr.execute("""
+            SELECT m.id, m.activo AND m.fecha_vencimiento >= %s,
+                   COALESCE(m.prestamos_activos, 0),
+                   COALESCE(r.max_prestamos_activos, %s)
+              FROM biblioteca_miembro m
+         LEFT JOIN biblioteca_membresia_regla r ON r.tipo_membresia = m.tipo_membresia
+             WHERE m.id IN %s
+             ORDER BY m.id
+               FOR UPDATE OF m
+        """, [fields.Date.context_today(self), LIMITE_PRESTAMOS_ACTIVOS, tuple(nuevos)])
+        for miembro_id, vigente, activos, limite in self.env.cr.fetchall():
+            if not vigente:
+                raise ValidationError(
+                    f'La membresía de {self.browse(miembro_id).name} está vencida o inactiva.'
+                )
+            if activos + nuevos[miembro_id] > limite:
+                raise ValidationError(
+                    f'El miembro {self.browse(miembro_id).name} superaría el límite de '
+                    f'{limite} préstamos activos. '
                     'No puede solicitar más libros.'
                 )
 
@@ -195,8 +525,19 @@ class Miembro(models.Model):
             'context': {'default_miembro_id': self.id},
         }
 
+    def action_renovar_prestamos(self):
+        """Renueva de una vez todos los préstamos activos del miembro."""
+        prestamos = self.env['biblioteca.prestamo'].search([
+            ('miembro_id', 'in', self.ids),
+            ('estado', '=', 'activo'),
+        ])
+        return prestamos._notificar_renovacion(prestamos._renovar_en_lote())
+
+    def action_saldar_multas(self):
+        """Registra el pago de todas las multas pendientes del miembro."""
+        self.write({'saldo_multas': 0.0})
+
     def action_renovar_membresia(self):
         """Renueva la membresía por un año más."""
-        for record in self:
-            record.fecha_registro = fields.Date.today()
-            # fecha_vencimiento se recalcula automáticamente
+        # fecha_vencimiento se recalcula automáticamente
+        self.write({'fecha_registro': fields.Date.today(), 'activo': True})
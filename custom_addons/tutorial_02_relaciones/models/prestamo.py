@@ -5,10 +5,40 @@ Modelo de Préstamo - Tutorial 02
 Modelo central que demuestra múltiples Many2one y lógica de negocio.
 """
 
-from odoo import models, fields, api
+import logging
+import threading
+import time
+from collections import Counter
+
+import psycopg2
+
+from odoo import models, fields, api, Command
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
 from dateutil.relativedelta import relativedelta
 
+_logger = logging.getLogger(__name__)
+
+# Estados en los que el libro sigue en manos del miembro
+ESTADOS_ABIERTOS = ('activo', 'vencido')
+
+# Bloqueo de libros al prestar (ver _bloquear_libros)
+REINTENTOS_BLOQUEO = 3
+ESPERA_BLOQUEO = 0.05  # segundos; se duplica en cada reintento
+
+# Renovaciones permitidas si el tipo de membresía no tiene regla
+LIMITE_RENOVACIONES = 2
+
+# Resultado de la renovación por préstamo (ver _renovar_en_lote)
+MOTIVOS_RENOVACION = {
+    'renovado': 'Renovado',
+    'no_activo': 'El préstamo no está activo',
+    'con_retraso': 'El préstamo tiene retraso',
+    'reservado': 'Otro miembro reservó el libro',
+    'limite': 'Alcanzó el máximo de renovaciones',
+}
+
 
 class Prestamo(models.Model):
     """
@@ -35,9 +65,10 @@ class Prestamo(models.Model):
         string='Libro',
         required=True,
         ondelete='restrict',
-        # Dominio: solo libros disponibles
-        # (Se puede hacer dinámico con una función)
-        domain="[('disponible', '=', True)]",
+        # Dominio: libros disponibles o reservados para este miembro
+        # (reserva lista para retirar, ver biblioteca.reserva)
+        domain="['|', ('disponible', '=', True), ('reserva_ids', 'any', "
+               "[('estado', '=', 'disponible'), ('miembro_id', '=', miembro_id)])]",
     )
 
     miembro_id = fields.Many2one(
@@ -45,7 +76,8 @@ class Prestamo(models.Model):
         string='Miembro',
         required=True,
         ondelete='restrict',
-        domain="[('activo', '=', True)]",
+        # Usa el índice parcial (fecha_vencimiento) WHERE activo
+        domain="[('activo', '=', True), ('fecha_vencimiento', '>=', context_today().strftime('%Y-%m-%d'))]",
     )
 
     # =====================================================
@@ -84,33 +116,69 @@ class Prestamo(models.Model):
         help='Número de días que se presta el libro',
     )
 
+    # Almacenado e indexado para poder ordenar ("más atrasados primero"),
+    # filtrar y agrupar en SQL. Como depende de la fecha de hoy, el cron
+    # diario lo actualiza (_actualizar_dias_retraso).
     dias_retraso = fields.Integer(
         string='Días de Retraso',
         compute='_compute_dias_retraso',
+        store=True,
+        index=True,
+    )
+
+    renovaciones = fields.Integer(
+        string='Renovaciones',
+        default=0,
+        readonly=True,
+        copy=False,
+    )
+
+    # Fecha del último recordatorio enviado (ver _cron_enviar_recordatorios)
+    ultimo_recordatorio = fields.Date(
+        string='Último Recordatorio',
+        readonly=True,
+        copy=False,
+    )
+
+    # Multa acumulada por el retraso (ver _calcular_multas)
+    multa = fields.Float(
+        string='Multa',
+        digits=(10, 2),
+        readonly=True,
+        default=0.0,
     )
 
     # =====================================================
-    # CAMPOS RELATED (info del libro y miembro)
+    # COPIAS DESNORMALIZADAS (info del libro y miembro)
     # =====================================================
 
+    # No son campos related: un related almacenado se recalcula en la misma
+    # transacción que renombra el libro, reescribiendo todos sus préstamos.
+    # Aquí son columnas propias e indexadas (se pueden ordenar, buscar y
+    # agrupar sin JOIN) que se copian al crear el préstamo y se sincronizan
+    # en diferido y por lotes con _cron_sincronizar_copias.
     libro_titulo = fields.Char(
         string='Título',
-        related='libro_id.name',
+        readonly=True,
+        index=True,
     )
 
     libro_autor = fields.Char(
         string='Autor',
-        related='libro_id.autor',
+        readonly=True,
+        index=True,
     )
 
     miembro_nombre = fields.Char(
         string='Nombre del Miembro',
-        related='miembro_id.name',
+        readonly=True,
+        index=True,
     )
 
     miembro_email = fields.Char(
         string='Email',
-        related='miembro_id.email',
+        readonly=True,
+        index=True,
     )
 
     # =====================================================
@@ -144,7 +212,7 @@ class Prestamo(models.Model):
                     record.dias_retraso = delta.days
                 else:
                     record.dias_retraso = 0
-            elif record.estado == 'activo' and record.fecha_devolucion_esperada:
+            elif record.estado in ESTADOS_ABIERTOS and record.fecha_devolucion_esperada:
                 # Si aún tiene el libro, calcular retraso actual
                 if hoy > record.fecha_devolucion_esperada:
                     delta = hoy - record.fecha_devolucion_esperada
@@ -192,15 +260,110 @@ class Prestamo(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Al crear préstamo, marcar libro como prestado."""
-        prestamos = super().create(vals_list)
-        for prestamo in prestamos:
-            prestamo.libro_id.write({
-                'estado': 'prestado',
-                'disponible': False,
-            })
+        """
+        Al crear préstamo, marcar libro como prestado.
+
+        Preparado para lotes (ej. préstamo a una clase entera): las
+        validaciones y la actualización de los libros se hacen una sola vez
+        para todo vals_list, así la cantidad de consultas SQL no crece con
+        el tamaño del lote.
+        """
+        abiertos = [
+            vals for vals in vals_list
+            if vals.get('estado', 'activo') in ESTADOS_ABIERTOS
+        ]
+        self._bloquear_libros([vals['libro_id'] for vals in abiertos if vals.get('libro_id')])
+        self._check_libro_disponible([vals['libro_id'] for vals in abiertos if vals.get('libro_id')])
+        self.env['biblioteca.miembro']._check_limite_nuevos_prestamos(
+            Counter(vals['miembro_id'] for vals in abiertos if vals.get('miembro_id'))
+        )
+        self.env['biblioteca.reserva']._cumplir_reservas([
+            (vals['libro_id'], vals.get('miembro_id'))
+            for vals in abiertos if vals.get('libro_id')
+        ])
+        self._agregar_copias(vals_list)
+        try:
+            with self.env.cr.savepoint():
+                prestamos = super().create(vals_list)
+        except psycopg2.errors.ExclusionViolation:
+            # Otro mostrador prestó el libro entre el chequeo y el INSERT:
+            # tras volver al savepoint se busca el préstamo que lo ocupa para
+            # dar el mismo mensaje (a quién está prestado)
+            self._check_libro_disponible([vals['libro_id'] for vals in abiertos if vals.get('libro_id')])
+            raise ValidationError(
+                'El libro acaba de ser prestado desde otro puesto. '
+                'Actualice la pantalla e intente nuevamente.'
+            )
+        # Un único write para todos los libros del lote
+        prestamos.filtered(lambda p: p.estado in ESTADOS_ABIERTOS).libro_id.write({
+            'estado': 'prestado',
+            'disponible': False,
+        })
+        self.env['biblioteca.miembro']._ajustar_contadores(
+            Counter(p.miembro_id.id for p in prestamos),
+            Counter(p.miembro_id.id for p in prestamos if p.estado in ESTADOS_ABIERTOS),
+        )
         return prestamos
 
+    def write(self, vals):
+        """Verificar disponibilidad si se cambia el libro o se reabre el préstamo."""
+        if 'libro_id' in vals or vals.get('estado') in ESTADOS_ABIERTOS:
+            libro_ids = []
+            for record in self:
+                estado = vals.get('estado', record.estado)
+                if estado not in ESTADOS_ABIERTOS:
+                    continue
+                libro_id = vals.get('libro_id', record.libro_id.id)
+                if libro_id != record.libro_id.id or record.estado not in ESTADOS_ABIERTOS:
+                    libro_ids.append(libro_id)
+            self._bloquear_libros(libro_ids)
+            self._check_libro_disponible(libro_ids, excluir=self)
+        if 'miembro_id' in vals or vals.get('estado') in ESTADOS_ABIERTOS:
+            nuevos = Counter()
+            for record in self:
+                miembro_id = vals.get('miembro_id', record.miembro_id.id)
+                abierto_antes = record.estado in ESTADOS_ABIERTOS and miembro_id == record.miembro_id.id
+                if vals.get('estado', record.estado) in ESTADOS_ABIERTOS and not abierto_antes:
+                    nuevos[miembro_id] += 1
+            self.env['biblioteca.miembro']._check_limite_nuevos_prestamos(nuevos)
+        if 'libro_id' in vals or 'miembro_id' in vals:
+            self._agregar_copias([vals])
+        if 'estado' not in vals and 'miembro_id' not in vals:
+            return super().write(vals)
+
+        # Cambia el miembro o el estado: ajustar los contadores del miembro
+        antes = [(p.miembro_id.id, p.estado in ESTADOS_ABIERTOS) for p in self]
+        resultado = super().write(vals)
+        total, activos = Counter(), Counter()
+        for (miembro_id, abierto), prestamo in zip(antes, self):
+            total[miembro_id] -= 1
+            activos[miembro_id] -= abierto
+            total[prestamo.miembro_id.id] += 1
+            activos[prestamo.miembro_id.id] += prestamo.estado in ESTADOS_ABIERTOS
+        self.env['biblioteca.miembro']._ajustar_contadores(total, activos)
+        return resultado
+
+    @api.model
+    def _agregar_copias(self, vals_list):
+        """
+        Completa en vals_list las copias de título/autor y nombre/email.
+
+        Lee todos los libros y miembros del lote de una vez (prefetch).
+        """
+        libros = {l.id: l for l in self.env['biblioteca.libro'].browse(
+            {vals['libro_id'] for vals in vals_list if vals.get('libro_id')})}
+        miembros = {m.id: m for m in self.env['biblioteca.miembro'].browse(
+            {vals['miembro_id'] for vals in vals_list if vals.get('miembro_id')})}
+        for vals in vals_list:
+            if 'libro_id' in vals:
+                libro = libros.get(vals['libro_id']) or self.env['biblioteca.libro']
+                vals['libro_titulo'] = libro.name
+                vals['libro_autor'] = libro.autor
+            if 'miembro_id' in vals:
+                miembro = miembros.get(vals['miembro_id']) or self.env['biblioteca.miembro']
+                vals['miembro_nombre'] = miembro.name
+                vals['miembro_email'] = miembro.email
+
     def unlink(self):
         """No permitir eliminar préstamos activos."""
         for record in self:
@@ -209,6 +372,11 @@ class Prestamo(models.Model):
                     'No se puede eliminar un préstamo activo. '
                     'Primero debe devolverse el libro.'
                 )
+        total, activos = Counter(), Counter()
+        for prestamo in self:
+            total[prestamo.miembro_id.id] -= 1
+            activos[prestamo.miembro_id.id] -= prestamo.estado in ESTADOS_ABIERTOS
+        self.env['biblioteca.miembro']._ajustar_contadores(total, activos)
         return super().unlink()
 
     # =====================================================
@@ -216,72 +384,695 @@ class Prestamo(models.Model):
     # =====================================================
 
     def action_devolver(self):
-        """Marca el préstamo como devuelto."""
-        for record in self:
-            if record.estado != 'activo':
-                raise UserError('Este préstamo ya fue devuelto.')
+        """
+        Marca los préstamos como devueltos.
+
+        Opera sobre el conjunto: un write en biblioteca.prestamo y otro en
+        biblioteca.libro, sin importar cuántos préstamos se devuelvan.
+        Los libros con reservas en espera quedan reservados para el
+        siguiente de la cola (ver biblioteca.reserva).
+        """
+        if self.filtered(lambda p: p.estado not in ESTADOS_ABIERTOS):
+            raise UserError('Este préstamo ya fue devuelto.')
+
+        self.write({
+            'estado': 'devuelto',
+            'fecha_devolucion_real': fields.Date.today(),
+        })
+        # Multa definitiva con el retraso real; después ya no se recalcula
+        self._calcular_multas(self)
+
+        # Reservar para el siguiente de la cola o marcar como disponibles
+        self.env['biblioteca.reserva']._liberar_libros(self.libro_id)
+
+    @api.model
+    def _devolver_por_escaneo(self, codigos):
+        """
+        Devuelve en lote los préstamos de los libros escaneados.
+
+        codigos: lista de ISBN (con o sin guiones) o IDs de libro, tal
+        como llegan del lector de código de barras.
+
+        Cada código se resuelve con el índice único del ISBN y el préstamo
+        abierto con el índice parcial de la constraint
+        libro_prestamo_abierto_unico. Todo el carrito se cierra con
+        action_devolver() en una sola transacción.
 
-            record.write({
-                'estado': 'devuelto',
-                'fecha_devolucion_real': fields.Date.today(),
-            })
+        Un mismo libro escaneado dos veces (ej. con y sin guiones) se
+        devuelve una vez y los códigos siguientes se informan como repetidos.
 
-            # Marcar libro como disponible
-            record.libro_id.write({
-                'estado': 'disponible',
-                'disponible': True,
-            })
+        Retorna: {'prestamos': recordset devuelto, 'no_encontrados': [códigos],
+                  'repetidos': [códigos]}
+        """
+        Libro = self.env['biblioteca.libro']
+        codigos = [c.strip() for c in codigos if c and c.strip()]
+
+        # Cada código se identifica por su ISBN normalizado o su ID de libro
+        claves, vistas, repetidos = {}, set(), []
+        for codigo in codigos:
+            isbn = Libro._normalizar_isbn(codigo)
+            if len(isbn) in (10, 13):
+                clave = ('isbn', isbn)
+            elif codigo.isdigit():
+                clave = ('id', int(codigo))
+            else:
+                clave = ('codigo', codigo)
+            if clave in vistas:
+                repetidos.append(codigo)
+            else:
+                vistas.add(clave)
+                claves[codigo] = clave
+
+        isbns = [valor for tipo, valor in claves.values() if tipo == 'isbn']
+        ids = [valor for tipo, valor in claves.values() if tipo == 'id']
+        libros = Libro.search([
+            '|', ('isbn', 'in', isbns), ('id', 'in', ids),
+        ]) if isbns or ids else Libro
+        prestamos = self.search([
+            ('libro_id', 'in', libros.ids),
+            ('estado', 'in', ESTADOS_ABIERTOS),
+        ])
+
+        devueltos = set()
+        for libro in prestamos.libro_id:
+            devueltos.add(('isbn', libro.isbn))
+            devueltos.add(('id', libro.id))
+        no_encontrados = [c for c, clave in claves.items() if clave not in devueltos]
+
+        if prestamos:
+            prestamos.action_devolver()
+        return {'prestamos': prestamos, 'no_encontrados': no_encontrados, 'repetidos': repetidos}
 
     def action_renovar(self):
         """Renueva el préstamo por más días."""
-        for record in self:
-            if record.estado != 'activo':
-                raise UserError('Solo se pueden renovar préstamos activos.')
+        resultado = self._verificar_renovacion()
+        rechazados = [
+            f'{prestamo.libro_id.name}: {MOTIVOS_RENOVACION[resultado[prestamo.id]]}'
+            for prestamo in self if resultado[prestamo.id] != 'renovado'
+        ]
+        if rechazados:
+            raise UserError('No se puede renovar:\n' + '\n'.join(rechazados))
+        self._aplicar_renovacion()
 
-            if record.dias_retraso > 0:
-                raise UserError(
-                    'No se puede renovar un préstamo con retraso. '
-                    'Por favor devuelva el libro primero.'
-                )
+    def action_renovar_lote(self):
+        """Renueva los préstamos seleccionados que cumplan las condiciones."""
+        return self._notificar_renovacion(self._renovar_en_lote())
+
+    def _verificar_renovacion(self):
+        """
+        Decide en UNA consulta qué préstamos se pueden renovar.
+
+        Condiciones: activo, sin retraso, sin reservas en espera para el
+        libro (usa el índice de la cola de reservas) y con menos
+        renovaciones que el máximo del tipo de membresía del miembro.
+
+        Retorna {prestamo_id: 'renovado' o clave de MOTIVOS_RENOVACION}.
+        """
+        if not self:
+            return {}
+        self.flush_recordset(['estado', 'fecha_devolucion_esperada', 'renovaciones'])
+        self.env['biblioteca.reserva'].flush_model(['libro_id', 'estado'])
+        self.env.cr.execute("""
+            SELECT p.id,
+                   CASE
+                       WHEN p.estado <> 'activo' THEN 'no_activo'
+                       WHEN p.fecha_devolucion_esperada < %(hoy)s THEN 'con_retraso'
+                       WHEN EXISTS (
+                            SELECT 1 FROM biblioteca_reserva r
+                             WHERE r.libro_id = p.libro_id AND r.estado = 'espera'
+                       ) THEN 'reservado'
+                       WHEN p.renovaciones >= COALESCE(rg.max_renovaciones, %(limite)s) THEN 'limite'
+                       ELSE 'renovado'
+                   END
+              FROM biblioteca_prestamo p
+              JOIN biblioteca_miembro m ON m.id = p.miembro_id
+         LEFT JOIN biblioteca_membresia_regla rg ON rg.tipo_membresia = m.tipo_membresia
+             WHERE p.id IN %(ids)s
+        """, {
+            'hoy': fields.Date.today(),
+            'limite': LIMITE_RENOVACIONES,
+            'ids': tuple(self.ids),
+        })
+        return dict(self.env.cr.fetchall())
+
+    def _aplicar_renovacion(self):
+        """
+        Extiende los préstamos: un write por cada valor distinto de
+        renovaciones (normalmente 1 a 3 writes), no uno por préstamo.
+        fecha_devolucion_esperada se recalcula para todo el grupo a la vez.
+        """
+        hoy = fields.Date.today()
+        for renovaciones, grupo in self.grouped('renovaciones').items():
+            grupo.write({'fecha_prestamo': hoy, 'renovaciones': renovaciones + 1})
 
-            # Extender la fecha de devolución
-            record.fecha_prestamo = fields.Date.today()
+    def _renovar_en_lote(self):
+        """
+        Renueva los préstamos elegibles y deja los demás sin cambios.
+
+        Retorna {prestamo_id: 'renovado' o clave de MOTIVOS_RENOVACION}.
+        """
+        resultado = self._verificar_renovacion()
+        self.filtered(lambda p: resultado.get(p.id) == 'renovado')._aplicar_renovacion()
+        return resultado
+
+    def _notificar_renovacion(self, resultado):
+        """Notificación con el resumen de una renovación en lote."""
+        renovados = sum(1 for motivo in resultado.values() if motivo == 'renovado')
+        rechazados = Counter(motivo for motivo in resultado.values() if motivo != 'renovado')
+        detalle = ', '.join(
+            f'{MOTIVOS_RENOVACION[motivo]}: {cantidad}' for motivo, cantidad in rechazados.items()
+        )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': f'{renovados} préstamos renovados',
+                'message': detalle or 'Todos los préstamos fueron renovados.',
+                'type': 'success' if not rechazados else 'warning',
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
 
     # =====================================================
     # RESTRICCIONES
     # =====================================================
 
-    @api.constrains('libro_id', 'estado')
-    def _check_libro_disponible(self):
-        """Verificar que el libro esté disponible al crear préstamo."""
-        for record in self:
-            if record.estado == 'activo':
-                # Buscar otros préstamos activos del mismo libro
-                otros = self.search([
-                    ('libro_id', '=', record.libro_id.id),
-                    ('estado', '=', 'activo'),
-                    ('id', '!=', record.id),
-                ])
-                if otros:
-                    raise ValidationError(
-                        f'El libro "{record.libro_id.name}" ya está prestado '
-                        f'a {otros[0].miembro_id.name}.'
-                    )
+    # Garantía a nivel de base de datos: como mucho un préstamo abierto
+    # por libro. A diferencia de un @api.constrains, no tiene condición de
+    # carrera: si dos mostradores prestan el mismo libro a la vez, PostgreSQL
+    # rechaza la segunda transacción y Odoo muestra este mensaje.
+    # EXCLUDE ... WHERE equivale a un índice único parcial sobre libro_id,
+    # que además acelera la búsqueda del préstamo abierto de un libro.
+    _sql_constraints = [
+        ('libro_prestamo_abierto_unico',
+         "EXCLUDE (libro_id WITH =) WHERE (estado IN ('activo', 'vencido'))",
+         'El libro ya tiene un préstamo activo. No se puede prestar dos veces a la vez.'),
+    ]
+
+    def init(self):
+        """
+        Índices parciales: cada uno contiene solo las filas que consulta su
+        proceso (cron de vencidos, archivado de historial), así siguen
+        siendo pequeños aunque la tabla crezca.
+        """
+        create_index(self._cr, 'biblioteca_prestamo_abierto_fecha_idx', self._table,
+                     ['fecha_devolucion_esperada'], where="estado IN ('activo', 'vencido')")
+
+        # Préstamos devueltos candidatos a pasar al historial
+        create_index(self._cr, 'biblioteca_prestamo_devuelto_fecha_idx', self._table,
+                     ['fecha_devolucion_real'], where="estado = 'devuelto'")
+
+        # Completar las copias de los préstamos que no las tienen (creados
+        # antes de que existieran, o restaurados/insertados por SQL). El
+        # filtro IS NULL usa los índices de libro_titulo y miembro_nombre,
+        # así en cada actualización solo se leen las filas incompletas.
+        self._cr.execute("""
+            UPDATE biblioteca_prestamo p
+               SET libro_titulo = l.name, libro_autor = l.autor
+              FROM biblioteca_libro l
+             WHERE p.libro_id = l.id AND p.libro_titulo IS NULL
+        """)
+        self._cr.execute("""
+            UPDATE biblioteca_prestamo p
+               SET miembro_nombre = m.name, miembro_email = rp.email
+              FROM biblioteca_miembro m
+              JOIN res_partner rp ON rp.id = m.partner_id
+             WHERE p.miembro_id = m.id AND p.miembro_nombre IS NULL
+        """)
+
+    @api.model
+    def _bloquear_libros(self, libro_ids):
+        """
+        Bloquea las filas de los libros antes de prestarlos.
+
+        Con varios mostradores prestando a la vez, dos transacciones que
+        actualizan el mismo libro terminan en un error de serialización y
+        Odoo repite la petición completa. Aquí el bloqueo se toma al inicio
+        y en orden de id (dos lotes con los mismos libros no se bloquean
+        mutuamente en orden inverso):
+
+        - FOR UPDATE NOWAIT: si otro puesto tiene el libro bloqueado falla
+          enseguida en lugar de esperar.
+        - Solo se reintenta esta consulta (dentro de un savepoint), con una
+          espera corta que se duplica en cada intento.
+        - Si otra transacción ya modificó el libro, PostgreSQL informa un
+          error de serialización: se deja pasar para que Odoo repita la
+          petición, que al volver a empezar ve el libro ya prestado.
+
+        Los conflictos de cada llamada se suman en biblioteca.prestamo.bloqueo
+        (ver _registrar_bloqueo y _estadisticas_bloqueo).
+        """
+        ids = sorted(set(libro_ids))
+        if not ids:
+            return
+        contadores = Counter()
+        for intento in range(REINTENTOS_BLOQUEO + 1):
+            try:
+                with self.env.cr.savepoint(flush=False):
+                    self.env.cr.execute("""
+                        SELECT id FROM biblioteca_libro
+                         WHERE id IN %s
+                         ORDER BY id
+                           FOR UPDATE NOWAIT
+                    """, [tuple(ids)])
+                self._registrar_bloqueo(contadores)
+                return
+            except psycopg2.errors.LockNotAvailable:
+                contadores['conflictos'] += 1
+                if intento == REINTENTOS_BLOQUEO:
+                    break
+                contadores['reintentos'] += 1
+                time.sleep(ESPERA_BLOQUEO * 2 ** intento)
+            except psycopg2.errors.SerializationFailure:
+                contadores['serializacion'] += 1
+                self._registrar_bloqueo(contadores)
+                raise
+
+        contadores['fallidos'] += 1
+        self._registrar_bloqueo(contadores)
+        _logger.info('Préstamo rechazado por bloqueo de libros %s: %s', ids, dict(contadores))
+        raise ValidationError(
+            'Otro puesto está prestando este libro en este momento. '
+            'Intente nuevamente en unos segundos.'
+        )
+
+    @api.model
+    def _registrar_bloqueo(self, contadores):
+        """
+        Guarda los contadores de contención en una transacción aparte: el
+        préstamo rechazado hace rollback, pero el conflicto queda registrado
+        y lo ven todos los workers. Sin conflictos no se escribe nada.
+        """
+        if not contadores:
+            return
+        with self.env.registry.cursor() as cr:
+            self.env(cr=cr)['biblioteca.prestamo.bloqueo']._sumar(contadores)
+
+    @api.model
+    def _estadisticas_bloqueo(self, desde=None):
+        """
+        Contadores de contención de todos los workers (desde una fecha,
+        opcional): conflictos, reintentos, fallidos y serializacion.
+        """
+        return self.env['biblioteca.prestamo.bloqueo'].sudo()._totales(desde)
+
+    @api.model
+    def _check_libro_disponible(self, libro_ids, excluir=None):
+        """
+        Verificar que los libros estén disponibles antes de prestarlos.
+
+        La constraint SQL ya lo garantiza; este chequeo existe para dar un
+        mensaje más amigable (a quién está prestado). Se llama desde create()
+        y write() ANTES de escribir, porque el INSERT/UPDATE fallaría primero
+        en la base de datos. Usa una única consulta para todo el lote en lugar
+        de un search por registro.
+        """
+        if not libro_ids:
+            return
+        repetidos = [libro_id for libro_id, n in Counter(libro_ids).items() if n > 1]
+        if repetidos:
+            libro = self.env['biblioteca.libro'].browse(repetidos[0])
+            raise ValidationError(
+                f'El libro "{libro.name}" aparece más de una vez en el mismo lote.'
+            )
+
+        domain = [('libro_id', 'in', libro_ids), ('estado', 'in', ESTADOS_ABIERTOS)]
+        if excluir:
+            domain.append(('id', 'not in', excluir.ids))
+        otro = self.search(domain, limit=1)
+        if otro:
+            raise ValidationError(
+                f'El libro "{otro.libro_id.name}" ya está prestado '
+                f'a {otro.miembro_id.name}.'
+            )
 
     # =====================================================
     # CRON JOB (se ejecuta automáticamente)
     # =====================================================
 
     @api.model
-    def _cron_actualizar_vencidos(self):
+    def _cron_actualizar_vencidos(self, tamano_lote=None, tiempo_maximo=None):
         """
         Método para ejecutar periódicamente.
         Marca como vencidos los préstamos que pasaron su fecha.
+
+        Trabaja por lotes para no bloquear millones de filas en una sola
+        transacción:
+        - Cada lote (tamano_lote préstamos) se escribe y se confirma (commit).
+        - Si se supera tiempo_maximo (segundos), el cron se vuelve a
+          programar con _trigger() y continúa en otra ejecución.
+        - Es reanudable: los préstamos ya marcados dejan de cumplir el
+          dominio, así que si el proceso se interrumpe no se repite trabajo.
+
+        Parámetros configurables (ir.config_parameter):
+        - tutorial_02_relaciones.vencidos_lote (default 1000)
+        - tutorial_02_relaciones.vencidos_tiempo_maximo (default 60)
+
+        Al terminar, actualiza los días de retraso (_actualizar_dias_retraso)
+        y las multas (_calcular_multas).
+
+        Retorna un resumen: {'procesados', 'retraso_actualizados',
+        'multas_actualizadas', 'segundos', 'completo'}
         """
+        ICP = self.env['ir.config_parameter'].sudo()
+        tamano_lote = tamano_lote or int(ICP.get_param(
+            'tutorial_02_relaciones.vencidos_lote', 1000))
+        tiempo_maximo = tiempo_maximo or int(ICP.get_param(
+            'tutorial_02_relaciones.vencidos_tiempo_maximo', 60))
+        # En los tests no se puede hacer commit
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+
         hoy = fields.Date.today()
-        prestamos_vencidos = self.search([
-            ('estado', '=', 'activo'),
-            ('fecha_devolucion_esperada', '<', hoy),
-        ])
-        prestamos_vencidos.write({'estado': 'vencido'})
-        return True
+        inicio = time.monotonic()
+        procesados = 0
+        completo = False
+        while True:
+            lote = self.search([
+                ('estado', '=', 'activo'),
+                ('fecha_devolucion_esperada', '<', hoy),
+            ], limit=tamano_lote, order='id')
+            if not lote:
+                completo = True
+                break
+            lote.write({'estado': 'vencido'})
+            procesados += len(lote)
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info('Préstamos vencidos: %s procesados', procesados)
+            if time.monotonic() - inicio > tiempo_maximo:
+                # Quedan préstamos: continuar en una nueva ejecución del cron
+                self.env.ref('tutorial_02_relaciones.ir_cron_actualizar_vencidos')._trigger()
+                break
+
+        retraso_actualizados = multas_actualizadas = 0
+        if completo:
+            retraso_actualizados = self._actualizar_dias_retraso(tamano_lote, auto_commit)
+            multas_actualizadas = self._calcular_multas()
+
+        resumen = {
+            'procesados': procesados,
+            'retraso_actualizados': retraso_actualizados,
+            'multas_actualizadas': multas_actualizadas,
+            'segundos': round(time.monotonic() - inicio, 2),
+            'completo': completo,
+        }
+        _logger.info('Actualización de vencidos finalizada: %s', resumen)
+        return resumen
+
+    @api.model
+    def _actualizar_dias_retraso(self, tamano_lote=1000, auto_commit=False):
+        """
+        Recalcula dias_retraso de los préstamos abiertos ya vencidos.
+
+        Es incremental: solo toca préstamos abiertos con fecha de devolución
+        pasada cuyo valor cambió (índice biblioteca_prestamo_abierto_fecha_idx).
+        Se hace con UPDATE directo en SQL por lotes, sin cargar registros en
+        Python; después se invalida la caché del ORM.
+
+        Retorna la cantidad de préstamos actualizados.
+        """
+        self.flush_model(['estado', 'fecha_devolucion_esperada', 'dias_retraso'])
+        hoy = fields.Date.today()
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                UPDATE biblioteca_prestamo
+                   SET dias_retraso = %(hoy)s - fecha_devolucion_esperada
+                 WHERE id IN (
+                        SELECT id
+                          FROM biblioteca_prestamo
+                         WHERE estado IN %(estados)s
+                           AND fecha_devolucion_esperada < %(hoy)s
+                           AND dias_retraso IS DISTINCT FROM %(hoy)s - fecha_devolucion_esperada
+                         LIMIT %(limite)s
+                 )
+            """, {'hoy': hoy, 'estados': ESTADOS_ABIERTOS, 'limite': tamano_lote})
+            total += self.env.cr.rowcount
+            if self.env.cr.rowcount < tamano_lote:
+                break
+            if auto_commit:
+                self.env.cr.commit()
+        self.invalidate_model(['dias_retraso'])
+        return total
+
+    @api.model
+    def _calcular_multas(self, prestamos=None):
+        """
+        Recalcula las multas de los préstamos abiertos con retraso en UNA
+        sentencia SQL y actualiza el saldo de los miembros con la diferencia.
+
+        multa = min(tope, max(dias_retraso - dias_gracia, 0) * tarifa_diaria)
+        según la regla del tipo de membresía del miembro.
+
+        - Solo se escriben los préstamos cuya multa cambió.
+        - El saldo del miembro se incrementa con la suma de las diferencias
+          (saldo_multas = saldo_multas + delta), no se vuelve a sumar todo.
+        - Los préstamos devueltos no se recalculan: su multa queda fija (y
+          quizás ya pagada) aunque después cambie la regla. action_devolver
+          la calcula por última vez pasando los préstamos en `prestamos`.
+
+        Retorna la cantidad de préstamos cuya multa cambió.
+        """
+        if prestamos is not None and not prestamos:
+            return 0
+        if prestamos is None:
+            filtro = SQL('p.estado IN %s', ESTADOS_ABIERTOS)
+        else:
+            filtro = SQL('p.id IN %s', tuple(prestamos.ids))
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            WITH calculo AS (
+                SELECT p.id, p.miembro_id, COALESCE(p.multa, 0) AS anterior,
+                       CASE
+                           WHEN r.id IS NULL THEN 0
+                           WHEN r.multa_maxima > 0 THEN LEAST(
+                               r.multa_maxima,
+                               GREATEST(p.dias_retraso - r.dias_gracia, 0) * r.tarifa_diaria)
+                           ELSE GREATEST(p.dias_retraso - r.dias_gracia, 0) * r.tarifa_diaria
+                       END AS nueva
+                  FROM biblioteca_prestamo p
+                  JOIN biblioteca_miembro m ON m.id = p.miembro_id
+             LEFT JOIN biblioteca_membresia_regla r ON r.tipo_membresia = m.tipo_membresia
+                 WHERE p.dias_retraso > 0
+                   AND %s
+            ),
+            actualizados AS (
+                UPDATE biblioteca_prestamo p
+                   SET multa = c.nueva
+                  FROM calculo c
+                 WHERE p.id = c.id
+                   AND c.nueva <> c.anterior
+             RETURNING c.miembro_id, c.nueva - c.anterior AS delta
+            ),
+            saldos AS (
+                UPDATE biblioteca_miembro m
+                   SET saldo_multas = COALESCE(m.saldo_multas, 0) + d.total
+                  FROM (SELECT miembro_id, SUM(delta) AS total
+                          FROM actualizados
+                         GROUP BY miembro_id) d
+                 WHERE m.id = d.miembro_id
+             RETURNING m.id
+            )
+            SELECT (SELECT count(*) FROM actualizados), (SELECT count(*) FROM saldos)
+        """, filtro))
+        prestamos_actualizados, _miembros = self.env.cr.fetchone()
+        self.invalidate_model(['multa'])
+        self.env['biblioteca.miembro'].invalidate_model(['saldo_multas'])
+        return prestamos_actualizados
+
+    # =====================================================
+    # RECORDATORIOS (CRON)
+    # =====================================================
+
+    @api.model
+    def _prestamos_por_recordar(self, limite_miembros):
+        """
+        Préstamos abiertos que necesitan aviso, agrupados por miembro.
+
+        Una sola consulta sobre el índice parcial de préstamos abiertos
+        (fecha_devolucion_esperada). Un préstamo se avisa:
+        - una vez cuando faltan dias_aviso_previo días o menos,
+        - al vencer, y luego cada intervalo_avisos_vencidos días.
+
+        Retorna [(miembro_id, [prestamo_id, ...]), ...], como máximo
+        limite_miembros grupos.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        dias_aviso = int(ICP.get_param('tutorial_02_relaciones.dias_aviso_previo', 2))
+        intervalo = int(ICP.get_param('tutorial_02_relaciones.intervalo_avisos_vencidos', 7))
+        hoy = fields.Date.today()
+
+        self.flush_model(['estado', 'fecha_devolucion_esperada', 'miembro_id',
+                          'miembro_email', 'ultimo_recordatorio'])
+        self.env.cr.execute("""
+            SELECT miembro_id, array_agg(id ORDER BY fecha_devolucion_esperada, id)
+              FROM biblioteca_prestamo
+             WHERE estado IN %(abiertos)s
+               AND fecha_devolucion_esperada <= %(limite)s
+               AND COALESCE(miembro_email, '') <> ''
+               AND (ultimo_recordatorio IS NULL
+                    OR (fecha_devolucion_esperada < %(hoy)s
+                        AND (ultimo_recordatorio < fecha_devolucion_esperada
+                             OR ultimo_recordatorio <= %(repetir)s)))
+             GROUP BY miembro_id
+             ORDER BY miembro_id
+             LIMIT %(grupos)s
+        """, {
+            'abiertos': ESTADOS_ABIERTOS,
+            'limite': hoy + relativedelta(days=dias_aviso),
+            'hoy': hoy,
+            'repetir': hoy - relativedelta(days=intervalo),
+            'grupos': limite_miembros,
+        })
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _cron_enviar_recordatorios(self, tamano_lote=100):
+        """
+        Envía a cada miembro UN mensaje con todos sus préstamos por vencer
+        o vencidos.
+
+        - Selección: _prestamos_por_recordar (una consulta, agrupada).
+        - Renderizado: la plantilla se renderiza para todo el lote de
+          miembros de una vez (_render_field con la lista de ids).
+        - Encolado: un create de mail.mail por lote, con commit entre lotes;
+          ultimo_recordatorio se marca en el mismo lote, así el proceso es
+          reanudable y no repite avisos.
+
+        Parámetros (ir.config_parameter):
+        - tutorial_02_relaciones.recordatorios_por_ejecucion (default 500):
+          tope de mensajes por ejecución; si quedan pendientes el cron se
+          reprograma dentro de una hora.
+        - tutorial_02_relaciones.recordatorios_destino: 'mail' (default) o
+          'registro' para guardarlos en biblioteca.recordatorio sin SMTP.
+
+        Retorna la cantidad de mensajes generados.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        maximo = int(ICP.get_param('tutorial_02_relaciones.recordatorios_por_ejecucion', 500))
+        destino = ICP.get_param('tutorial_02_relaciones.recordatorios_destino', 'mail')
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        plantilla = self.env.ref('tutorial_02_relaciones.mail_template_recordatorio_prestamos')
+
+        # Un grupo extra para saber si quedan pendientes después del tope
+        grupos = self._prestamos_por_recordar(maximo + 1)
+        pendientes = len(grupos) > maximo
+        grupos = grupos[:maximo]
+
+        enviados = 0
+        hoy = fields.Date.today()
+        for inicio in range(0, len(grupos), tamano_lote):
+            lote = dict(grupos[inicio:inicio + tamano_lote])
+            miembros = self.env['biblioteca.miembro'].browse(list(lote))
+            render = plantilla.with_context(prestamos_por_miembro=lote)
+            asuntos = render._render_field('subject', miembros.ids)
+            cuerpos = render._render_field('body_html', miembros.ids)
+            remitentes = render._render_field('email_from', miembros.ids)
+
+            if destino == 'registro':
+                self.env['biblioteca.recordatorio'].create([{
+                    'miembro_id': miembro.id,
+                    'prestamo_ids': [Command.set(lote[miembro.id])],
+                    'email_to': miembro.email,
+                    'asunto': asuntos[miembro.id],
+                    'cuerpo': cuerpos[miembro.id],
+                } for miembro in miembros])
+            else:
+                self.env['mail.mail'].sudo().create([{
+                    'model': 'biblioteca.miembro',
+                    'res_id': miembro.id,
+                    'email_from': remitentes[miembro.id],
+                    'email_to': miembro.email,
+                    'subject': asuntos[miembro.id],
+                    'body_html': cuerpos[miembro.id],
+                    'auto_delete': True,
+                } for miembro in miembros])
+
+            prestamo_ids = [pid for ids in lote.values() for pid in ids]
+            self.env.cr.execute(
+                'UPDATE biblioteca_prestamo SET ultimo_recordatorio = %s WHERE id IN %s',
+                [hoy, tuple(prestamo_ids)])
+            self.invalidate_model(['ultimo_recordatorio'])
+            enviados += len(miembros)
+            if auto_commit:
+                self.env.cr.commit()
+
+        if pendientes:
+            self.env.ref('tutorial_02_relaciones.ir_cron_enviar_recordatorios')._trigger(
+                fields.Datetime.now() + relativedelta(hours=1))
+        _logger.info('Recordatorios generados: %s (pendientes: %s)', enviados, pendientes)
+        return enviados
+
+    @api.model
+    def _programar_sincronizacion_copias(self):
+        """Pide al cron de copias que se ejecute lo antes posible."""
+        cron = self.env.ref('tutorial_02_relaciones.ir_cron_sincronizar_copias',
+                            raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _cron_sincronizar_copias(self, tamano_lote=5000):
+        """
+        Propaga a los préstamos los cambios de título/autor y nombre/email.
+
+        Libro.write y res.partner.write solo marcan el registro con
+        copias_pendientes y disparan este cron, así renombrar un libro con
+        100.000 préstamos no reescribe esas filas en la transacción del
+        usuario. Aquí se actualizan en SQL por lotes, con commit entre lotes.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        fuentes = [
+            ('biblioteca.libro', 'libro_id', """
+                UPDATE biblioteca_prestamo p
+                   SET libro_titulo = l.name, libro_autor = l.autor
+                  FROM biblioteca_libro l
+                 WHERE p.libro_id = l.id
+                   AND p.id IN (
+                        SELECT p2.id
+                          FROM biblioteca_prestamo p2
+                          JOIN biblioteca_libro l2 ON l2.id = p2.libro_id
+                         WHERE p2.libro_id IN %(ids)s
+                           AND (p2.libro_titulo IS DISTINCT FROM l2.name
+                                OR p2.libro_autor IS DISTINCT FROM l2.autor)
+                         LIMIT %(limite)s
+                   )
+            """),
+            ('biblioteca.miembro', 'miembro_id', """
+                UPDATE biblioteca_prestamo p
+                   SET miembro_nombre = m.name, miembro_email = rp.email
+                  FROM biblioteca_miembro m
+                  JOIN res_partner rp ON rp.id = m.partner_id
+                 WHERE p.miembro_id = m.id
+                   AND p.id IN (
+                        SELECT p2.id
+                          FROM biblioteca_prestamo p2
+                          JOIN biblioteca_miembro m2 ON m2.id = p2.miembro_id
+                          JOIN res_partner rp2 ON rp2.id = m2.partner_id
+                         WHERE p2.miembro_id IN %(ids)s
+                           AND (p2.miembro_nombre IS DISTINCT FROM m2.name
+                                OR p2.miembro_email IS DISTINCT FROM rp2.email)
+                         LIMIT %(limite)s
+                   )
+            """),
+        ]
+        total = 0
+        self.env.flush_all()
+        for modelo, campo, consulta in fuentes:
+            pendientes = self.env[modelo].with_context(active_test=False).search(
+                [('copias_pendientes', '=', True)])
+            if not pendientes:
+                continue
+            while True:
+                self.env.cr.execute(consulta, {'ids': tuple(pendientes.ids), 'limite': tamano_lote})
+                total += self.env.cr.rowcount
+                if self.env.cr.rowcount < tamano_lote:
+                    break
+                if auto_commit:
+                    self.env.cr.commit()
+            pendientes.write({'copias_pendientes': False})
+            if auto_commit:
+                self.env.cr.commit()
+        self.invalidate_model(['libro_titulo', 'libro_autor', 'miembro_nombre', 'miembro_email'])
+        _logger.info('Copias de préstamos sincronizadas: %s', total)
+        return total
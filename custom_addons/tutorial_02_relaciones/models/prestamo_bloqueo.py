@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Estadísticas de Bloqueo de Libros - Tutorial 02
+
+Cuántas veces dos mostradores intentaron prestar el mismo libro a la vez
+(ver Prestamo._bloquear_libros). Un registro por día, compartido por todos
+los workers: así la contención se puede medir desde la interfaz o la API
+y no solo dentro del proceso que la sufrió.
+"""
+
+from odoo import models, fields, api
+
+# Contadores que registra _bloquear_libros
+CONTADORES_BLOQUEO = ('conflictos', 'reintentos', 'fallidos', 'serializacion')
+
+
+class PrestamoBloqueo(models.Model):
+    """
+    Contención al prestar, por día.
+
+    Los contadores se suman con un único INSERT ... ON CONFLICT DO UPDATE
+    (incremento atómico), sin leer el registro antes: dos workers que
+    registran a la vez no se pisan.
+    """
+
+    _name = 'biblioteca.prestamo.bloqueo'
+    _description = 'Contención al Prestar'
+    _order = 'fecha desc'
+    _log_access = False
+
+    fecha = fields.Date(string='Fecha', required=True, readonly=True)
+    conflictos = fields.Integer(
+        string='Conflictos',
+        readonly=True,
+        help='Intentos de bloqueo que encontraron el libro tomado por otro puesto',
+    )
+    reintentos = fields.Integer(string='Reintentos', readonly=True)
+    fallidos = fields.Integer(
+        string='Rechazados',
+        readonly=True,
+        help='Préstamos rechazados tras agotar los reintentos',
+    )
+    serializacion = fields.Integer(
+        string='Errores de Serialización',
+        readonly=True,
+        help='Peticiones que Odoo tuvo que repetir completas',
+    )
+
+    _sql_constraints = [
+        ('fecha_unique', 'UNIQUE(fecha)', 'Ya existe un registro para esta fecha.'),
+    ]
+
+    @api.model
+    def _sumar(self, contadores):
+        """Suma contadores ({nombre: cantidad}) al registro de hoy."""
+        valores = [contadores.get(nombre, 0) for nombre in CONTADORES_BLOQUEO]
+        self.env.cr.execute("""
+            INSERT INTO biblioteca_prestamo_bloqueo AS b
+                   (fecha, conflictos, reintentos, fallidos, serializacion)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (fecha) DO UPDATE
+               SET conflictos = b.conflictos + EXCLUDED.conflictos,
+                   reintentos = b.reintentos + EXCLUDED.reintentos,
+                   fallidos = b.fallidos + EXCLUDED.fallidos,
+                   serializacion = b.serializacion + EXCLUDED.serializacion
+        """, [fields.Date.context_today(self)] + valores)
+        self.invalidate_model(list(CONTADORES_BLOQUEO))
+
+    @api.model
+    def _totales(self, desde=None):
+        """Totales de todos los workers (desde una fecha, opcional)."""
+        dominio = [('fecha', '>=', desde)] if desde else []
+        [totales] = self._read_group(
+            dominio, aggregates=[f'{nombre}:sum' for nombre in CONTADORES_BLOQUEO])
+        return {nombre: valor or 0 for nombre, valor in zip(CONTADORES_BLOQUEO, totales)}
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Historial de Préstamos - Tutorial 02
+
+Los préstamos devueltos hace mucho tiempo se mueven a una tabla aparte
+para que biblioteca_prestamo solo contenga el conjunto "caliente"
+(préstamos abiertos y devoluciones recientes).
+"""
+
+import logging
+import threading
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class PrestamoHistorico(models.Model):
+    """
+    Préstamo devuelto y archivado.
+
+    Tabla compacta: sin campos de auditoría (_log_access = False) y con
+    copias del título/autor y del nombre del miembro, así el historial se
+    puede consultar aunque el libro o el miembro ya no existan.
+    """
+
+    _name = 'biblioteca.prestamo.historico'
+    _description = 'Historial de Préstamos'
+    _order = 'fecha_prestamo desc'
+    _log_access = False  # No crear create_uid, create_date, write_uid, write_date
+
+    prestamo_original_id = fields.Integer(
+        string='ID Préstamo Original',
+        readonly=True,
+    )
+
+    libro_id = fields.Many2one(
+        comodel_name='biblioteca.libro',
+        string='Libro',
+        ondelete='set null',
+        index=True,
+        readonly=True,
+    )
+
+    miembro_id = fields.Many2one(
+        comodel_name='biblioteca.miembro',
+        string='Miembro',
+        ondelete='set null',
+        index=True,
+        readonly=True,
+    )
+
+    libro_titulo = fields.Char(string='Título', readonly=True)
+    libro_autor = fields.Char(string='Autor', readonly=True)
+    miembro_nombre = fields.Char(string='Nombre del Miembro', readonly=True)
+
+    fecha_prestamo = fields.Date(string='Fecha de Préstamo', readonly=True)
+    fecha_devolucion_esperada = fields.Date(string='Fecha Devolución Esperada', readonly=True)
+    fecha_devolucion_real = fields.Date(string='Fecha Devolución Real', readonly=True)
+    dias_retraso = fields.Integer(string='Días de Retraso', readonly=True)
+    multa = fields.Float(string='Multa', digits=(10, 2), readonly=True)
+
+    # =====================================================
+    # ARCHIVADO (CRON)
+    # =====================================================
+
+    @api.model
+    def _cron_archivar_prestamos(self, tamano_lote=5000):
+        """
+        Mueve al historial los préstamos devueltos antes del horizonte.
+
+        Cada lote es una única sentencia SQL (DELETE ... RETURNING dentro de
+        un INSERT), así un préstamo nunca queda en las dos tablas ni en
+        ninguna. Se hace commit entre lotes.
+
+        Parámetro (ir.config_parameter):
+        - tutorial_02_relaciones.horizonte_historial_dias (default 365)
+
+        Retorna la cantidad de préstamos movidos.
+        """
+        dias = int(self.env['ir.config_parameter'].sudo().get_param(
+            'tutorial_02_relaciones.horizonte_historial_dias', 365))
+        limite = fields.Date.subtract(fields.Date.today(), days=dias)
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+
+        self.env.flush_all()
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                WITH movidos AS (
+                    DELETE FROM biblioteca_prestamo
+                     WHERE id IN (
+                            SELECT id
+                              FROM biblioteca_prestamo
+                             WHERE estado = 'devuelto'
+                               AND fecha_devolucion_real < %(limite)s
+                             ORDER BY id
+                             LIMIT %(lote)s
+                     )
+                 RETURNING id, libro_id, miembro_id, libro_titulo, libro_autor,
+                           miembro_nombre, fecha_prestamo, fecha_devolucion_esperada,
+                           fecha_devolucion_real, dias_retraso, multa
+                )
+                INSERT INTO biblioteca_prestamo_historico (
+                    prestamo_original_id, libro_id, miembro_id, libro_titulo, libro_autor,
+                    miembro_nombre, fecha_prestamo, fecha_devolucion_esperada,
+                    fecha_devolucion_real, dias_retraso, multa
+                )
+                SELECT * FROM movidos
+            """, {'limite': limite, 'lote': tamano_lote})
+            total += self.env.cr.rowcount
+            if self.env.cr.rowcount < tamano_lote:
+                break
+            if auto_commit:
+                self.env.cr.commit()
+
+        self.env['biblioteca.prestamo'].invalidate_model()
+        self.env['biblioteca.libro'].invalidate_model(['prestamo_ids'])
+        self.env['biblioteca.miembro'].invalidate_model(['prestamo_ids'])
+        _logger.info('Préstamos movidos al historial: %s', total)
+        return total
+
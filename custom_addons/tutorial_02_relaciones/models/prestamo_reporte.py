@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Reporte de Préstamos - Tutorial 02
+
+Demuestra un modelo basado en una vista SQL (_auto = False).
+"""
+
+from odoo import models, fields, tools
+
+
+class PrestamoReporte(models.Model):
+    """
+    Reporte de todos los préstamos: actuales + historial.
+
+    MODELO SQL (_auto = False):
+    Odoo no crea una tabla; init() crea una VISTA de PostgreSQL que une
+    biblioteca_prestamo y biblioteca_prestamo_historico con UNION ALL.
+    Permite agrupar y filtrar sobre ambos como si fueran uno solo.
+    """
+
+    _name = 'biblioteca.prestamo.reporte'
+    _description = 'Reporte de Préstamos (actuales e historial)'
+    _auto = False
+    _order = 'fecha_prestamo desc'
+
+    origen = fields.Selection([
+        ('actual', 'Actual'),
+        ('historico', 'Historial'),
+    ], string='Origen', readonly=True)
+
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', readonly=True)
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', readonly=True)
+    libro_titulo = fields.Char(string='Título', readonly=True)
+    libro_autor = fields.Char(string='Autor', readonly=True)
+    miembro_nombre = fields.Char(string='Nombre del Miembro', readonly=True)
+    fecha_prestamo = fields.Date(string='Fecha de Préstamo', readonly=True)
+    fecha_devolucion_esperada = fields.Date(string='Fecha Devolución Esperada', readonly=True)
+    fecha_devolucion_real = fields.Date(string='Fecha Devolución Real', readonly=True)
+    dias_retraso = fields.Integer(string='Días de Retraso', readonly=True, group_operator='avg')
+    estado = fields.Selection([
+        ('activo', 'Activo'),
+        ('devuelto', 'Devuelto'),
+        ('vencido', 'Vencido'),
+    ], string='Estado', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        # Los ids deben ser únicos en la vista: pares para actuales, impares para historial
+        self.env.cr.execute("""
+            CREATE OR REPLACE VIEW biblioteca_prestamo_reporte AS (
+                SELECT p.id * 2 AS id,
+                       'actual' AS origen,
+                       p.libro_id, p.miembro_id, p.libro_titulo, p.libro_autor,
+                       p.miembro_nombre, p.fecha_prestamo, p.fecha_devolucion_esperada,
+                       p.fecha_devolucion_real, p.dias_retraso, p.estado
+                  FROM biblioteca_prestamo p
+                UNION ALL
+                SELECT h.id * 2 + 1 AS id,
+                       'historico' AS origen,
+                       h.libro_id, h.miembro_id, h.libro_titulo, h.libro_autor,
+                       h.miembro_nombre, h.fecha_prestamo, h.fecha_devolucion_esperada,
+                       h.fecha_devolucion_real, h.dias_retraso, 'devuelto' AS estado
+                  FROM biblioteca_prestamo_historico h
+            )
+        """)
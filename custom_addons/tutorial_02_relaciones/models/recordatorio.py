@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de Recordatorios - Tutorial 02
+
+Destino local de los recordatorios de préstamos: cuando el parámetro
+tutorial_02_relaciones.recordatorios_destino vale 'registro', los mensajes
+se guardan aquí en lugar de encolarse en mail.mail. Sirve para probar el
+envío sin un servidor SMTP.
+"""
+
+from odoo import models, fields
+
+
+class Recordatorio(models.Model):
+    """Un mensaje por miembro y ejecución, con todos sus préstamos."""
+
+    _name = 'biblioteca.recordatorio'
+    _description = 'Recordatorio de Préstamos'
+    _order = 'id desc'
+
+    miembro_id = fields.Many2one(
+        comodel_name='biblioteca.miembro',
+        string='Miembro',
+        ondelete='cascade',
+        index=True,
+        readonly=True,
+    )
+
+    prestamo_ids = fields.Many2many(
+        comodel_name='biblioteca.prestamo',
+        string='Préstamos',
+        readonly=True,
+    )
+
+    email_to = fields.Char(string='Para', readonly=True)
+    asunto = fields.Char(string='Asunto', readonly=True)
+    cuerpo = fields.Html(string='Mensaje', readonly=True)
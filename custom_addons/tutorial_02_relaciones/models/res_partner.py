@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Extensión de res.partner - Tutorial 02
+
+Los préstamos guardan una copia del nombre y email del miembro.
+Cuando cambian en el contacto, hay que sincronizarlas.
+"""
+
+from odoo import models
+
+
+class ResPartnerBiblioteca(models.Model):
+    """Avisa a los préstamos cuando cambia el nombre o email del contacto."""
+
+    _inherit = 'res.partner'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'name' in vals or 'email' in vals:
+            miembros = self.env['biblioteca.miembro'].sudo().search([
+                ('partner_id', 'in', self.ids),
+                ('copias_pendientes', '=', False),
+            ])
+            if miembros:
+                miembros.write({'copias_pendientes': True})
+                self.env['biblioteca.prestamo']._programar_sincronizacion_copias()
+        return res
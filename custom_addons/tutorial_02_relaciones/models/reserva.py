@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo de Reservas - Tutorial 02
+
+Cola de espera por libro: cuando un libro prestado se devuelve, la reserva
+más antigua pasa a "Lista para Retirar" y el libro queda Reservado para ese
+miembro.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+# Reservas que todavía ocupan un lugar en la cola
+ESTADOS_RESERVA_ABIERTOS = ('espera', 'disponible')
+
+
+class Reserva(models.Model):
+    """
+    Reserva de un libro por un miembro.
+
+    COLA FIFO POR LIBRO:
+    El orden de la cola es el id de la reserva (la más antigua primero).
+    El índice parcial (libro_id, id) WHERE estado = 'espera' permite
+    encontrar al siguiente de la cola con una sola lectura del índice,
+    sin recorrer todas las reservas del libro.
+
+    CICLO DE VIDA:
+    espera -> disponible (al devolverse el libro) -> cumplida (al prestarlo)
+                                                  -> vencida (no lo retiró a tiempo)
+    espera / disponible -> cancelada
+    """
+
+    _name = 'biblioteca.reserva'
+    _description = 'Reserva de Libro'
+    _order = 'id'
+
+    libro_id = fields.Many2one(
+        comodel_name='biblioteca.libro',
+        string='Libro',
+        required=True,
+        ondelete='cascade',
+    )
+
+    miembro_id = fields.Many2one(
+        comodel_name='biblioteca.miembro',
+        string='Miembro',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        domain="[('activo', '=', True), ('fecha_vencimiento', '>=', context_today().strftime('%Y-%m-%d'))]",
+    )
+
+    fecha_reserva = fields.Datetime(
+        string='Fecha de Reserva',
+        default=fields.Datetime.now,
+        readonly=True,
+    )
+
+    fecha_limite = fields.Date(
+        string='Retirar Hasta',
+        readonly=True,
+        help='Fecha límite para retirar el libro una vez disponible',
+    )
+
+    estado = fields.Selection([
+        ('espera', 'En Espera'),
+        ('disponible', 'Lista para Retirar'),
+        ('cumplida', 'Cumplida'),
+        ('vencida', 'Vencida'),
+        ('cancelada', 'Cancelada'),
+    ], string='Estado', default='espera', required=True)
+
+    # Un miembro no puede estar dos veces en la cola del mismo libro
+    _sql_constraints = [
+        ('reserva_abierta_unica',
+         "EXCLUDE (libro_id WITH =, miembro_id WITH =) "
+         "WHERE (estado IN ('espera', 'disponible'))",
+         'El miembro ya tiene una reserva abierta para este libro.'),
+    ]
+
+    def init(self):
+        """
+        Índices parciales:
+        - Cola por libro: siguiente en espera = primer (libro_id, id).
+        - Reservas listas para retirar por fecha límite (cron de vencimiento).
+        """
+        create_index(self._cr, 'biblioteca_reserva_cola_idx', self._table,
+                     ['libro_id', 'id'], where="estado = 'espera'")
+        create_index(self._cr, 'biblioteca_reserva_disponible_limite_idx', self._table,
+                     ['fecha_limite'], where="estado = 'disponible'")
+
+    # =====================================================
+    # MÉTODOS CRUD
+    # =====================================================
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Si el libro ya está libre, la reserva pasa directo a disponible."""
+        reservas = super().create(vals_list)
+        libres = reservas.libro_id.filtered(lambda l: l.estado == 'disponible')
+        if libres:
+            self._liberar_libros(libres)
+        return reservas
+
+    # =====================================================
+    # COLA
+    # =====================================================
+
+    @api.model
+    def _dias_retiro(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'tutorial_02_relaciones.dias_retiro_reserva', '3'))
+
+    @api.model
+    def _promover_siguientes(self, libro_ids):
+        """
+        Pasa a 'disponible' la primera reserva en espera de cada libro.
+
+        Una sola sentencia para todos los libros: DISTINCT ON (libro_id)
+        con ORDER BY libro_id, id usa el índice de la cola.
+
+        Retorna el conjunto de ids de libros que quedaron reservados.
+        """
+        if not libro_ids:
+            return set()
+        self.flush_model(['libro_id', 'estado'])
+        fecha_limite = fields.Date.context_today(self) + timedelta(days=self._dias_retiro())
+        self.env.cr.execute("""
+            UPDATE biblioteca_reserva r
+               SET estado = 'disponible', fecha_limite = %s
+              FROM (
+                    SELECT DISTINCT ON (libro_id) id
+                      FROM biblioteca_reserva
+                     WHERE estado = 'espera'
+                       AND libro_id IN %s
+                     ORDER BY libro_id, id
+              ) siguiente
+             WHERE r.id = siguiente.id
+         RETURNING r.libro_id
+        """, [fecha_limite, tuple(libro_ids)])
+        reservados = {libro_id for libro_id, in self.env.cr.fetchall()}
+        self.invalidate_model(['estado', 'fecha_limite'])
+        return reservados
+
+    @api.model
+    def _liberar_libros(self, libros):
+        """
+        Los libros quedaron sin préstamo (devolución, reserva vencida o
+        cancelada): se reservan para el siguiente de la cola o, si no hay
+        nadie esperando, vuelven a estar disponibles.
+        """
+        reservados = self._promover_siguientes(libros.ids)
+        con_reserva = libros.filtered(lambda l: l.id in reservados)
+        con_reserva.write({'estado': 'reservado', 'disponible': False})
+        (libros - con_reserva).write({'estado': 'disponible', 'disponible': True})
+
+    @api.model
+    def _cumplir_reservas(self, pares):
+        """
+        Se llama al crear préstamos. pares: lista de (libro_id, miembro_id).
+
+        Un libro con una reserva lista para retirar solo se puede prestar
+        al miembro que la hizo; en ese caso la reserva queda cumplida.
+        Una única búsqueda para todo el lote.
+        """
+        if not pares:
+            return
+        listas = self.search([
+            ('libro_id', 'in', [libro_id for libro_id, _m in pares]),
+            ('estado', '=', 'disponible'),
+        ])
+        por_libro = {reserva.libro_id.id: reserva for reserva in listas}
+        cumplidas = self.browse()
+        for libro_id, miembro_id in pares:
+            reserva = por_libro.get(libro_id)
+            if not reserva:
+                continue
+            if reserva.miembro_id.id != miembro_id:
+                raise ValidationError(
+                    f'El libro "{reserva.libro_id.name}" está reservado '
+                    f'para {reserva.miembro_id.name}.'
+                )
+            cumplidas |= reserva
+        cumplidas.write({'estado': 'cumplida'})
+
+    # =====================================================
+    # MÉTODOS DE ACCIÓN
+    # =====================================================
+
+    def action_cancelar(self):
+        """Cancela las reservas; si alguna estaba lista, el libro pasa al siguiente."""
+        if self.filtered(lambda r: r.estado not in ESTADOS_RESERVA_ABIERTOS):
+            raise UserError('Solo se pueden cancelar reservas abiertas.')
+        listas = self.filtered(lambda r: r.estado == 'disponible')
+        self.write({'estado': 'cancelada'})
+        if listas:
+            self._liberar_libros(listas.libro_id)
+
+    # =====================================================
+    # CRON JOB
+    # =====================================================
+
+    @api.model
+    def _cron_vencer_reservas(self, tamano_lote=1000):
+        """
+        Vence las reservas que no se retiraron antes de la fecha límite.
+
+        Por lotes (índice parcial sobre fecha_limite) con commit entre
+        lotes; los libros de cada lote pasan al siguiente de la cola.
+
+        Retorna la cantidad de reservas vencidas.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        hoy = fields.Date.context_today(self)
+        total = 0
+        while True:
+            self.flush_model(['estado', 'fecha_limite'])
+            self.env.cr.execute("""
+                UPDATE biblioteca_reserva
+                   SET estado = 'vencida'
+                 WHERE id IN (
+                        SELECT id
+                          FROM biblioteca_reserva
+                         WHERE estado = 'disponible'
+                           AND fecha_limite < %s
+                         ORDER BY fecha_limite
+                         LIMIT %s
+                 )
+             RETURNING libro_id
+            """, [hoy, tamano_lote])
+            libro_ids = [libro_id for libro_id, in self.env.cr.fetchall()]
+            if not libro_ids:
+                break
+            total += len(libro_ids)
+            self.invalidate_model(['estado'])
+            self._liberar_libros(self.env['biblioteca.libro'].browse(set(libro_ids)))
+            if auto_commit:
+                self.env.cr.commit()
+            if len(libro_ids) < tamano_lote:
+                break
+
+        _logger.info('Reservas vencidas: %s', total)
+        return total
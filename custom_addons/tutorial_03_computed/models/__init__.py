@@ -1,2 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import inventario
+from . import libro
+from . import prestamo
@@ -5,9 +5,13 @@ Modelo de Inventario - Tutorial 03
 Demuestra campos calculados, onchange y constraints avanzados.
 """
 
+from collections import defaultdict
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from odoo.addons.tutorial_02_relaciones.models.prestamo import ESTADOS_ABIERTOS
+
 
 class InventarioLibro(models.Model):
     """
@@ -16,6 +20,7 @@ class InventarioLibro(models.Model):
     CAMPOS COMPUTED:
     - stock_total: suma de entradas
     - stock_disponible: total - prestados
+    - nivel_stock: según el stock disponible
     - valor_inventario: precio * cantidad
     """
 
@@ -69,47 +74,75 @@ class InventarioLibro(models.Model):
         help='Stock inicial + entradas - salidas',
     )
 
-    # Cantidad de libros actualmente prestados
+    # Cantidad de libros actualmente prestados. No es computed: lo mantienen
+    # los préstamos (ver _actualizar_prestados), así cambiar el estado de un
+    # préstamo no recorre libro_id.prestamo_ids de cada fila de inventario.
     prestados = fields.Integer(
         string='Prestados',
-        compute='_compute_prestados',
+        readonly=True,
     )
 
     # Stock disponible para préstamo
     stock_disponible = fields.Integer(
         string='Disponible',
-        compute='_compute_stock',
+        compute='_compute_disponible',
     )
 
     @api.depends('stock_inicial', 'entradas', 'salidas')
     def _compute_stock(self):
         """
-        Calcula stock total y disponible.
+        Calcula el stock total.
 
         @api.depends especifica qué campos "disparan" el recálculo.
         Si cualquiera de estos campos cambia, se recalcula automáticamente.
         """
         for record in self:
             record.stock_total = record.stock_inicial + record.entradas - record.salidas
+
+    @api.depends('stock_total', 'prestados')
+    def _compute_disponible(self):
+        for record in self:
             # Restamos los prestados del stock disponible
             record.stock_disponible = record.stock_total - record.prestados
 
-    @api.depends('libro_id', 'libro_id.prestamo_ids', 'libro_id.prestamo_ids.estado')
-    def _compute_prestados(self):
+    @api.model
+    def _actualizar_prestados(self, libro_ids):
         """
-        Cuenta cuántos libros están prestados actualmente.
-
-        NOTA: Dependemos de campos en modelos relacionados.
-        El path libro_id.prestamo_ids.estado significa:
-        "recalcular cuando cambie el estado de cualquier préstamo del libro"
+        Recalcula prestados de las filas de inventario de esos libros.
+
+        Lo llaman los préstamos al crearse, cambiar de estado o de libro y
+        al eliminarse (ver tutorial_03 models/prestamo.py), solo para los
+        libros afectados. Una consulta agrupada sobre biblioteca_prestamo
+        y un write por valor distinto, únicamente en las filas que cambian
+        (el write recalcula valor_inventario, que está almacenado).
+        Los préstamos vencidos también cuentan: el libro sigue fuera.
         """
-        for record in self:
-            if record.libro_id:
-                record.prestados = len(record.libro_id.prestamo_ids.filtered(
-                    lambda p: p.estado == 'activo'
-                ))
-            else:
-                record.prestados = 0
+        inventarios = self.search([('libro_id', 'in', list(libro_ids))])
+        if not inventarios:
+            return
+        conteo = dict(self.env['biblioteca.prestamo']._read_group(
+            [('libro_id', 'in', inventarios.libro_id.ids), ('estado', 'in', ESTADOS_ABIERTOS)],
+            groupby=['libro_id'],
+            aggregates=['__count'],
+        ))
+        por_valor = defaultdict(lambda: self.browse())
+        for record in inventarios:
+            prestados = conteo.get(record.libro_id, 0)
+            if record.prestados != prestados:
+                por_valor[prestados] |= record
+        for prestados, registros in por_valor.items():
+            registros.write({'prestados': prestados})
+
+    def init(self):
+        """Calcula prestados en las filas creadas antes de que fuera una columna."""
+        self._cr.execute("""
+            UPDATE biblioteca_inventario i
+               SET prestados = (SELECT count(*)
+                                  FROM biblioteca_prestamo p
+                                 WHERE p.libro_id = i.libro_id
+                                   AND p.estado IN %s)
+             WHERE i.prestados IS NULL
+        """, [ESTADOS_ABIERTOS])
 
     # =====================================================
     # CAMPO COMPUTED ALMACENADO (store=True)
@@ -275,6 +308,22 @@ class InventarioLibro(models.Model):
                     f'el stock total ({record.stock_inicial + record.entradas}).'
                 )
 
+    # =====================================================
+    # MÉTODOS CRUD
+    # =====================================================
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        inventarios = super().create(vals_list)
+        self._actualizar_prestados(inventarios.libro_id.ids)
+        return inventarios
+
+    def write(self, vals):
+        resultado = super().write(vals)
+        if 'libro_id' in vals:
+            self._actualizar_prestados(self.libro_id.ids)
+        return resultado
+
     # =====================================================
     # SQL CONSTRAINTS
     # =====================================================
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Extensión del Modelo Libro - Tutorial 03
+
+Integra el inventario con la fusión de libros duplicados.
+"""
+
+from odoo import models
+
+
+class LibroInventario(models.Model):
+    """
+    Extiende biblioteca.libro para que al fusionar duplicados
+    el inventario también pase al libro que se conserva.
+    """
+
+    _inherit = 'biblioteca.libro'
+
+    def _fusionar_en(self, destino):
+        """
+        Suma el stock de los libros fusionados en el inventario de destino.
+
+        Si destino no tiene inventario, se reasigna el primero de los
+        orígenes (libro_unique impide tener dos registros por libro).
+        """
+        Inventario = self.env['biblioteca.inventario']
+        origenes = Inventario.search([('libro_id', 'in', (self - destino).ids)])
+        if origenes:
+            principal = Inventario.search([('libro_id', '=', destino.id)], limit=1)
+            if not principal:
+                principal = origenes[:1]
+                origenes -= principal
+                principal.libro_id = destino
+            if origenes:
+                principal.write({
+                    'stock_inicial': principal.stock_inicial + sum(origenes.mapped('stock_inicial')),
+                    'entradas': principal.entradas + sum(origenes.mapped('entradas')),
+                    'salidas': principal.salidas + sum(origenes.mapped('salidas')),
+                })
+                origenes.unlink()
+        return super()._fusionar_en(destino)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Extensión del Modelo Préstamo - Tutorial 03
+
+Mantiene al día el campo prestados del inventario.
+"""
+
+from odoo import models, api
+
+
+class PrestamoInventario(models.Model):
+    """
+    Extiende biblioteca.prestamo para actualizar el inventario de los
+    libros afectados cuando un préstamo se crea, cambia de estado o de
+    libro, o se elimina.
+    """
+
+    _inherit = 'biblioteca.prestamo'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        prestamos = super().create(vals_list)
+        self.env['biblioteca.inventario']._actualizar_prestados(prestamos.libro_id.ids)
+        return prestamos
+
+    def write(self, vals):
+        if 'estado' not in vals and 'libro_id' not in vals:
+            return super().write(vals)
+        libros = self.libro_id
+        resultado = super().write(vals)
+        self.env['biblioteca.inventario']._actualizar_prestados((libros | self.libro_id).ids)
+        return resultado
+
+    def unlink(self):
+        libros = self.libro_id
+        resultado = super().unlink()
+        self.env['biblioteca.inventario']._actualizar_prestados(libros.ids)
+        return resultado
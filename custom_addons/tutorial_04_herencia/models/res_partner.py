@@ -12,6 +12,7 @@ TIPOS DE HERENCIA EN ODOO:
 """
 
 from odoo import models, fields, api
+from odoo.exceptions import UserError
 
 
 class ResPartnerAutor(models.Model):
@@ -213,9 +214,17 @@ class BibliotecaSocio(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('numero_socio', 'Nuevo') == 'Nuevo':
-                vals['numero_socio'] = self.env['ir.sequence'].next_by_code(
-                    'biblioteca.socio'
-                ) or 'SOC-0001'
+        # Reservar todos los números de socio del lote en una sola llamada
+        nuevos = [vals for vals in vals_list if vals.get('numero_socio', 'Nuevo') == 'Nuevo']
+        numeros = self.env['ir.sequence']._next_by_code_lote(
+            'biblioteca.socio', len(nuevos)
+        )
+        if len(numeros) < len(nuevos):
+            # Un número fijo de respaldo repetiría el número en todo el lote
+            raise UserError(
+                'No existe la secuencia de socios (biblioteca.socio). '
+                'Actualice el módulo para volver a crearla.'
+            )
+        for vals, numero in zip(nuevos, numeros):
+            vals['numero_socio'] = numero
         return super().create(vals_list)
@@ -19,7 +19,7 @@
     'author': 'Tutorial Odoo',
     'license': 'LGPL-3',
     'category': 'Tutorial',
-    'depends': ['tutorial_01_basico', 'web'],
+    'depends': ['tutorial_01_basico', 'tutorial_02_relaciones', 'web'],
     'data': [],
     'installable': True,
 }
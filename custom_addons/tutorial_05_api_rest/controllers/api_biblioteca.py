@@ -43,6 +43,7 @@ class BibliotecaAPI(http.Controller):
     - POST /api/biblioteca/libro - Crear libro
     - PUT  /api/biblioteca/libro/<id> - Actualizar libro
     - DELETE /api/biblioteca/libro/<id> - Eliminar libro
+    - POST /api/biblioteca/miembro/escaneo - Identificar miembro en el mostrador
     """
 
     # =====================================================
@@ -75,8 +76,21 @@ class BibliotecaAPI(http.Controller):
             'precio': libro.precio,
             'disponible': libro.disponible,
             'estado': libro.estado,
+            'active': libro.active,
         }
 
+    def _libro_model(self, incluir_archivados=False):
+        """
+        Devuelve el modelo de libros para las búsquedas de la API.
+
+        Por defecto search() ignora los libros archivados (active=False).
+        Con incluir_archivados se desactiva ese filtro (active_test=False).
+        """
+        Libro = request.env['biblioteca.libro']
+        if incluir_archivados in (True, 'true', '1'):
+            Libro = Libro.with_context(active_test=False)
+        return Libro
+
     # =====================================================
     # ENDPOINTS PÚBLICOS (sin autenticación)
     # =====================================================
@@ -97,6 +111,8 @@ class BibliotecaAPI(http.Controller):
         - limit: número máximo de resultados (default: 100)
         - offset: página (default: 0)
         - disponible: true/false
+
+        Los libros archivados nunca se exponen en la API pública.
         """
         try:
             limit = int(kwargs.get('limit', 100))
@@ -106,7 +122,7 @@ class BibliotecaAPI(http.Controller):
             if kwargs.get('disponible') == 'true':
                 domain.append(('disponible', '=', True))
 
-            libros = request.env['biblioteca.libro'].sudo().search(
+            libros = self._libro_model().sudo().search(
                 domain, limit=limit, offset=offset
             )
 
@@ -135,7 +151,8 @@ class BibliotecaAPI(http.Controller):
         auth='user',
         methods=['POST'],
     )
-    def get_libros(self, domain=None, limit=100, offset=0, order='name'):
+    def get_libros(self, domain=None, limit=100, offset=0, order='name',
+                   incluir_archivados=False):
         """
         POST /api/biblioteca/libros (JSON-RPC)
         Lista libros con filtros.
@@ -147,13 +164,14 @@ class BibliotecaAPI(http.Controller):
             "params": {
                 "domain": [["disponible", "=", true]],
                 "limit": 10,
-                "order": "name"
+                "order": "name",
+                "incluir_archivados": false
             },
             "id": 1
         }
         """
         domain = domain or []
-        libros = request.env['biblioteca.libro'].search(
+        libros = self._libro_model(incluir_archivados).search(
             domain, limit=limit, offset=offset, order=order
         )
 
@@ -243,7 +261,7 @@ class BibliotecaAPI(http.Controller):
         try:
             valid_fields = ['name', 'isbn', 'autor', 'editorial',
                            'fecha_publicacion', 'paginas', 'precio',
-                           'descripcion', 'disponible', 'estado']
+                           'descripcion', 'disponible', 'estado', 'active']
 
             vals = {k: v for k, v in kwargs.items() if k in valid_fields}
 
@@ -286,6 +304,46 @@ class BibliotecaAPI(http.Controller):
         except Exception as e:
             return {'error': str(e)}
 
+    # =====================================================
+    # MOSTRADOR
+    # =====================================================
+
+    @http.route(
+        '/api/biblioteca/miembro/escaneo',
+        type='json',
+        auth='user',
+        methods=['POST'],
+    )
+    def escanear_miembro(self, codigo=None, **kwargs):
+        """
+        POST /api/biblioteca/miembro/escaneo
+        Identifica al miembro por carnet, email o teléfono.
+
+        Body: {"params": {"codigo": "MBR-0042"}}
+
+        Devuelve en una sola respuesta el miembro, sus préstamos abiertos
+        y si puede llevar más libros (ver Miembro._buscar_por_escaneo).
+        """
+        return request.env['biblioteca.miembro']._buscar_por_escaneo(codigo)
+
+    @http.route(
+        '/api/biblioteca/estadisticas/bloqueo',
+        type='json',
+        auth='user',
+        methods=['POST'],
+    )
+    def estadisticas_bloqueo(self, desde=None, **kwargs):
+        """
+        POST /api/biblioteca/estadisticas/bloqueo
+        Contención al prestar (todos los workers).
+
+        Body: {"params": {"desde": "2024-01-01"}}  (opcional)
+
+        Devuelve {"conflictos", "reintentos", "fallidos", "serializacion"}
+        (ver Prestamo._estadisticas_bloqueo).
+        """
+        return request.env['biblioteca.prestamo']._estadisticas_bloqueo(desde)
+
     # =====================================================
     # ENDPOINTS REST PUROS (HTTP)
     # =====================================================
@@ -309,6 +367,7 @@ class BibliotecaAPI(http.Controller):
         - search: término de búsqueda
         - estado: disponible|prestado|reservado
         - limit: número máximo
+        - incluir_archivados: true para incluir libros archivados
         """
         try:
             domain = []
@@ -321,7 +380,9 @@ class BibliotecaAPI(http.Controller):
 
             limit = int(kwargs.get('limit', 50))
 
-            libros = request.env['biblioteca.libro'].search(domain, limit=limit)
+            libros = self._libro_model(kwargs.get('incluir_archivados')).search(
+                domain, limit=limit
+            )
 
             return self._response_json({
                 'success': True,
@@ -335,6 +396,65 @@ class BibliotecaAPI(http.Controller):
                 'error': str(e),
             }, status=500)
 
+    @http.route(
+        '/api/v2/libros/facetas',
+        type='http',
+        auth='public',
+        methods=['GET'],
+        csrf=False,
+    )
+    def rest_buscar_facetado(self, **kwargs):
+        """
+        GET /api/v2/libros/facetas
+        Búsqueda del catálogo público (OPAC) con conteos por faceta.
+
+        Query params:
+        - search: término de búsqueda (título o autor)
+        - categoria_id: incluye las subcategorías
+        - estado, editorial, decada (ej. 1990), disponible (true/false)
+        - limit, offset: paginación (default: 20, 0)
+
+        Resultados y facetas salen de una sola consulta
+        (ver LibroExtension._buscar_con_facetas).
+        """
+        try:
+            domain = []
+            if kwargs.get('search'):
+                domain += ['|', ('name', 'ilike', kwargs['search']),
+                           ('autor', 'ilike', kwargs['search'])]
+            if kwargs.get('categoria_id'):
+                domain.append(('categoria_ids', 'child_of', int(kwargs['categoria_id'])))
+            if kwargs.get('estado'):
+                domain.append(('estado', '=', kwargs['estado']))
+            if kwargs.get('editorial'):
+                domain.append(('editorial', '=', kwargs['editorial']))
+            if kwargs.get('decada'):
+                decada = int(kwargs['decada'])
+                domain += [('fecha_publicacion', '>=', f'{decada}-01-01'),
+                           ('fecha_publicacion', '<', f'{decada + 10}-01-01')]
+            if kwargs.get('disponible') in ('true', 'false'):
+                domain.append(('disponible', '=', kwargs['disponible'] == 'true'))
+
+            resultado = self._libro_model().sudo()._buscar_con_facetas(
+                domain,
+                offset=int(kwargs.get('offset', 0)),
+                limit=int(kwargs.get('limit', 20)),
+            )
+
+            return self._response_json({
+                'success': True,
+                'total': resultado['total'],
+                'results': [self._libro_to_dict(l) for l in resultado['libros']],
+                'facetas': resultado['facetas'],
+            })
+
+        except Exception as e:
+            _logger.error(f'Error en API: {e}')
+            return self._response_json({
+                'success': False,
+                'error': str(e),
+            }, status=500)
+
     @http.route(
         '/api/v2/libro/<int:libro_id>',
         type='http',
@@ -389,11 +509,14 @@ class BibliotecaAPI(http.Controller):
             <li><code>POST /api/biblioteca/libro/create</code> - Crear libro</li>
             <li><code>POST /api/biblioteca/libro/update/&lt;id&gt;</code> - Actualizar</li>
             <li><code>POST /api/biblioteca/libro/delete/&lt;id&gt;</code> - Eliminar</li>
+            <li><code>POST /api/biblioteca/miembro/escaneo</code> - Identificar miembro (carnet, email o teléfono)</li>
+            <li><code>POST /api/biblioteca/estadisticas/bloqueo</code> - Contención al prestar</li>
         </ul>
 
         <h2>Endpoints REST</h2>
         <ul>
             <li><code>GET /api/v2/libros</code> - Listar libros</li>
+            <li><code>GET /api/v2/libros/facetas</code> - Buscar en el catálogo con conteos por faceta (público)</li>
             <li><code>GET /api/v2/libro/&lt;id&gt;</code> - Obtener libro</li>
         </ul>
 
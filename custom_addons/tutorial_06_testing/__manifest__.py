@@ -19,7 +19,7 @@
     'author': 'Tutorial Odoo',
     'license': 'LGPL-3',
     'category': 'Tutorial',
-    'depends': ['tutorial_01_basico', 'tutorial_02_relaciones'],
+    'depends': ['tutorial_01_basico', 'tutorial_02_relaciones', 'tutorial_03_computed'],
     'data': [],
     'installable': True,
 }
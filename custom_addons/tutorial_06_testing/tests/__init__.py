@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import test_libro
 from . import test_prestamo
+from . import test_inventario
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del Modelo Inventario - Tutorial 06
+
+Verifica que los préstamos mantienen el campo prestados de
+tutorial_03_computed y que el stock disponible y el nivel lo siguen.
+"""
+
+from odoo.tests.common import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install', 'biblioteca', 'inventario')
+class TestInventario(TransactionCase):
+    """Tests para el modelo biblioteca.inventario."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Inventario = cls.env['biblioteca.inventario']
+        cls.Prestamo = cls.env['biblioteca.prestamo']
+
+        cls.libros = cls.env['biblioteca.libro'].create([
+            {'name': f'Inventario {i}', 'isbn': f'242424242424{i}'} for i in range(3)
+        ])
+        cls.miembro = cls.env['biblioteca.miembro'].create({
+            'partner_id': cls.env['res.partner'].create({'name': 'Lector Inventario'}).id,
+        })
+        cls.inventarios = cls.Inventario.create([
+            {'libro_id': libro.id, 'stock_inicial': 3} for libro in cls.libros
+        ])
+
+    def test_prestados_agrupados(self):
+        """
+        Test: crear, vencer y devolver préstamos actualiza prestados
+        (los vencidos también cuentan).
+        """
+        activo, vencido = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': self.miembro.id}
+            for libro in self.libros[:2]
+        ])
+        vencido.estado = 'vencido'
+
+        self.assertEqual(self.inventarios.mapped('prestados'), [1, 1, 0])
+        self.assertEqual(self.inventarios.mapped('stock_disponible'), [2, 2, 3])
+        self.assertEqual(self.inventarios.mapped('nivel_stock'), ['bajo', 'bajo', 'bajo'])
+
+        activo.action_devolver()
+        self.assertEqual(self.inventarios.mapped('prestados'), [0, 1, 0])
+
+    def test_prestados_cambio_de_libro(self):
+        """
+        Test: mover un préstamo a otro libro, devolverlo y eliminarlo actualiza
+        el inventario de los dos libros.
+        """
+        prestamo = self.Prestamo.create({
+            'libro_id': self.libros[0].id,
+            'miembro_id': self.miembro.id,
+        })
+        prestamo.libro_id = self.libros[1]
+        self.assertEqual(self.inventarios.mapped('prestados'), [0, 1, 0])
+
+        prestamo.action_devolver()
+        prestamo.unlink()
+        self.assertEqual(self.inventarios.mapped('prestados'), [0, 0, 0])
+        self.assertEqual(self.inventarios.mapped('stock_disponible'), [3, 3, 3])
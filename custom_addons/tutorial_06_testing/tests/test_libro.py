@@ -18,7 +18,7 @@ docker compose exec odoo odoo -d NOMBRE_BD --test-tags=/tutorial_06_testing.test
 """
 
 from odoo.tests.common import TransactionCase, tagged
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from datetime import date
 
 
@@ -208,6 +208,14 @@ class TestLibroSearch(TransactionCase):
             {'name': 'Python Avanzado', 'autor': 'María', 'paginas': 300},
             {'name': 'JavaScript', 'autor': 'Pedro', 'paginas': 200},
         ])
+        cls.libro_isbn = cls.Libro.create({
+            'name': 'Manual de Referencia',
+            'isbn': '978-0-306-40615-7',
+        })
+        # Sin ISBN, pero su título empieza con los mismos dígitos
+        cls.libro_titulo_isbn = cls.Libro.create({
+            'name': '9780306406157 Edición Comentada',
+        })
 
     def test_search_count(self):
         """Test: search_count devuelve el número correcto."""
@@ -242,3 +250,188 @@ class TestLibroSearch(TransactionCase):
         ordenados = self.libros.sorted('paginas')
         for i in range(len(ordenados) - 1):
             self.assertLessEqual(ordenados[i].paginas, ordenados[i+1].paginas)
+
+    def test_name_search_prefijo(self):
+        """Test: name_search encuentra por prefijo de título y de autor."""
+        ids = [r[0] for r in self.Libro.name_search('Python')]
+        self.assertIn(self.libros[0].id, ids)
+        self.assertIn(self.libros[1].id, ids)
+
+        ids = [r[0] for r in self.Libro.name_search('Pedr')]
+        self.assertIn(self.libros[2].id, ids)
+
+    def test_name_search_isbn_exacto_primero(self):
+        """Test: un ISBN exacto aparece antes que las coincidencias en el título."""
+        ids = [r[0] for r in self.Libro.name_search('9780306406157')]
+        # Por orden alfabético "9780..." iría antes que "Manual..."
+        self.assertEqual(ids[0], self.libro_isbn.id)
+        self.assertIn(self.libro_titulo_isbn.id, ids)
+
+    def test_name_search_respeta_dominio(self):
+        """Test: el dominio del campo (ej. solo disponibles) se aplica."""
+        self.libros[0].action_marcar_prestado()
+        ids = [r[0] for r in self.Libro.name_search(
+            'Python', args=[('disponible', '=', True)])]
+        self.assertNotIn(self.libros[0].id, ids)
+        self.assertIn(self.libros[1].id, ids)
+
+
+@tagged('post_install', '-at_install', 'biblioteca', 'duplicados')
+class TestLibroDuplicado(TransactionCase):
+    """Tests para la detección y fusión de libros duplicados."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Libro = cls.env['biblioteca.libro']
+        cls.Duplicado = cls.env['biblioteca.libro.duplicado']
+
+        cls.original = cls.Libro.create({
+            'name': 'Cien Años de Soledad',
+            'autor': 'Gabriel García Márquez',
+            'isbn': '9780307474728',
+        })
+        # Mismo libro cargado en otra sucursal: sin acentos, con subtítulo y sin ISBN
+        cls.copia = cls.Libro.create({
+            'name': 'Cien anos de soledad: edicion conmemorativa',
+            'autor': 'Gabriel Garcia Marquez',
+        })
+
+    def test_clave_normalizada(self):
+        """Test: la clave ignora acentos, mayúsculas y subtítulo."""
+        self.assertEqual(self.original.clave_duplicado, self.copia.clave_duplicado)
+
+    def test_buscar_y_fusionar(self):
+        """Test: el grupo se detecta y la fusión reasigna préstamos."""
+        partner = self.env['res.partner'].create({'name': 'Lector Duplicados'})
+        miembro = self.env['biblioteca.miembro'].create({'partner_id': partner.id})
+        prestamo = self.env['biblioteca.prestamo'].create({
+            'libro_id': self.copia.id,
+            'miembro_id': miembro.id,
+        })
+
+        grupos = self.Duplicado._buscar_duplicados()
+        grupo = grupos.filtered(lambda g: self.copia in g.libro_ids)
+        self.assertEqual(len(grupo), 1)
+        self.assertIn(self.original, grupo.libro_ids)
+        self.assertEqual(grupo.libro_principal_id, self.original, "Se prefiere el libro con ISBN")
+
+        grupo.action_fusionar()
+
+        self.assertFalse(self.copia.exists())
+        self.assertEqual(prestamo.libro_id, self.original)
+        self.assertEqual(self.original.estado, 'prestado')
+        self.assertEqual(grupo.estado, 'fusionado')
+
+    def test_fusionar_prestamo_vencido(self):
+        """Test: un préstamo vencido movido al principal lo deja prestado."""
+        partner = self.env['res.partner'].create({'name': 'Lector Vencido'})
+        miembro = self.env['biblioteca.miembro'].create({'partner_id': partner.id})
+        prestamo = self.env['biblioteca.prestamo'].create({
+            'libro_id': self.copia.id,
+            'miembro_id': miembro.id,
+        })
+        prestamo.estado = 'vencido'
+
+        self.copia._fusionar_en(self.original)
+
+        self.assertEqual(prestamo.libro_id, self.original)
+        self.assertEqual(self.original.estado, 'prestado')
+        self.assertFalse(self.original.disponible)
+
+    def test_fusionar_con_dos_copias_prestadas(self):
+        """Test: si las dos copias están prestadas, la fusión se rechaza sin cambios."""
+        Miembro = self.env['biblioteca.miembro']
+        ana, beto = Miembro.create([
+            {'partner_id': self.env['res.partner'].create({'name': nombre}).id}
+            for nombre in ('Dos Copias Ana', 'Dos Copias Beto')
+        ])
+        prestamos = self.env['biblioteca.prestamo'].create([
+            {'libro_id': self.original.id, 'miembro_id': ana.id},
+            {'libro_id': self.copia.id, 'miembro_id': beto.id},
+        ])
+
+        with self.assertRaises(UserError):
+            self.copia._fusionar_en(self.original)
+
+        self.assertTrue(self.copia.exists())
+        self.assertEqual(prestamos[1].libro_id, self.copia)
+
+    def test_duplicados_ignora_archivados(self):
+        """Test: un libro archivado no se propone como duplicado."""
+        self.copia.action_archive()
+        grupos = self.Duplicado._buscar_duplicados()
+        self.assertFalse(grupos.filtered(lambda g: self.copia in g.libro_ids))
+
+    def test_fusionar_conserva_historial(self):
+        """Test: el historial archivado de la copia pasa al libro principal."""
+        historico = self.env['biblioteca.prestamo.historico'].create({
+            'libro_id': self.copia.id,
+            'libro_titulo': self.copia.name,
+            'fecha_prestamo': date(2020, 1, 10),
+        })
+
+        self.copia._fusionar_en(self.original)
+
+        self.assertEqual(historico.libro_id, self.original)
+
+    def test_fusionar_conserva_reservas(self):
+        """Test: las reservas de la copia pasan a la cola del principal en orden."""
+        Miembro = self.env['biblioteca.miembro']
+        ana, beto, carla = Miembro.create([
+            {'partner_id': self.env['res.partner'].create({'name': nombre}).id}
+            for nombre in ('Fusión Ana', 'Fusión Beto', 'Fusión Carla')
+        ])
+        prestamo = self.env['biblioteca.prestamo'].create({
+            'libro_id': self.copia.id,
+            'miembro_id': ana.id,
+        })
+        Reserva = self.env['biblioteca.reserva']
+        reserva_beto, reserva_carla = Reserva.create([
+            {'libro_id': self.copia.id, 'miembro_id': beto.id},
+            {'libro_id': self.copia.id, 'miembro_id': carla.id},
+        ])
+
+        self.copia._fusionar_en(self.original)
+
+        self.assertEqual((reserva_beto | reserva_carla).libro_id, self.original)
+        self.assertEqual(reserva_beto.estado, 'espera')
+        prestamo.action_devolver()
+        self.assertEqual(reserva_beto.estado, 'disponible')
+        self.assertEqual(reserva_carla.estado, 'espera')
+        self.assertEqual(self.original.estado, 'reservado')
+
+
+@tagged('post_install', '-at_install', 'biblioteca', 'archivo')
+class TestLibroArchivo(TransactionCase):
+    """Tests para el archivado de libros retirados."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Libro = cls.env['biblioteca.libro']
+        cls.libros = cls.Libro.create([
+            {'name': 'Retirado Uno', 'autor': 'Autor Archivo'},
+            {'name': 'Retirado Dos', 'autor': 'Autor Archivo'},
+        ])
+
+    def test_archivar_en_lote(self):
+        """Test: los archivados desaparecen de search y name_search."""
+        self.libros.action_archive()
+
+        self.assertFalse(self.libros.filtered('active'))
+        self.assertFalse(self.Libro.search([('autor', '=', 'Autor Archivo')]))
+        self.assertFalse(self.Libro.name_search('Retirado'))
+
+        # Opción explícita para incluirlos
+        todos = self.Libro.with_context(active_test=False).search([
+            ('autor', '=', 'Autor Archivo'),
+        ])
+        self.assertEqual(todos, self.libros)
+
+    def test_no_archivar_prestado(self):
+        """Test: un libro prestado no se puede archivar."""
+        self.libros[0].action_marcar_prestado()
+        with self.assertRaises(ValidationError):
+            self.libros.action_archive()
+        self.assertTrue(self.libros[1].active)
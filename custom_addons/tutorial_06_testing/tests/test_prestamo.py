@@ -5,9 +5,16 @@ Tests del Modelo Préstamo - Tutorial 06
 Demuestra tests más complejos con relaciones entre modelos.
 """
 
+from odoo import Command
+from odoo.tests import Form
 from odoo.tests.common import TransactionCase, tagged
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools.safe_eval import safe_eval
+import base64
 from datetime import date, timedelta
+from unittest.mock import patch
+
+from odoo.sql_db import db_connect
 
 
 @tagged('post_install', '-at_install', 'biblioteca', 'prestamo')
@@ -139,6 +146,28 @@ class TestPrestamo(TransactionCase):
         self.assertGreaterEqual(self.miembro.prestamo_count, 1)
         self.assertGreaterEqual(self.miembro.prestamos_activos, 1)
 
+    def test_libro_ya_prestado(self):
+        """Test: Un libro no puede tener dos préstamos activos."""
+        self.Prestamo.create({
+            'libro_id': self.libro_disponible.id,
+            'miembro_id': self.miembro.id,
+        })
+
+        with self.assertRaises(ValidationError) as context:
+            self.Prestamo.create({
+                'libro_id': self.libro_disponible.id,
+                'miembro_id': self.miembro.id,
+            })
+        self.assertIn(self.miembro.name, str(context.exception))
+
+    def test_libro_repetido_en_lote(self):
+        """Test: Un lote con el mismo libro dos veces se rechaza."""
+        with self.assertRaises(ValidationError):
+            self.Prestamo.create([
+                {'libro_id': self.libro_otro.id, 'miembro_id': self.miembro.id},
+                {'libro_id': self.libro_otro.id, 'miembro_id': self.miembro.id},
+            ])
+
 
 @tagged('post_install', '-at_install', 'biblioteca', 'integracion')
 class TestIntegracionBiblioteca(TransactionCase):
@@ -227,3 +256,682 @@ class TestIntegracionBiblioteca(TransactionCase):
         miembro.invalidate_recordset(['prestamos_activos', 'prestamo_count'])
         self.assertEqual(miembro.prestamos_activos, 3)
         self.assertEqual(miembro.prestamo_count, 3)
+
+    def test_prestamo_en_lote(self):
+        """
+        Test: Crear varios préstamos en una sola llamada (préstamo a una clase).
+        """
+        partner = self.Partner.create({'name': 'Lote Prestamos'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libros = self.Libro.create([
+            {'name': f'Libro Lote {i}', 'isbn': f'555555555555{i}'}
+            for i in range(3)
+        ])
+
+        prestamos = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': miembro.id}
+            for libro in libros
+        ])
+
+        self.assertEqual(len(prestamos), 3)
+        self.assertEqual(set(libros.mapped('estado')), {'prestado'})
+        self.assertFalse(any(libros.mapped('disponible')))
+
+    def test_limite_prestamos_en_lote(self):
+        """
+        Test: El límite de préstamos se valida para el lote completo.
+        """
+        partner = self.Partner.create({'name': 'Limite Lote'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libros = self.Libro.create([
+            {'name': f'Libro Limite {i}', 'isbn': f'666666666666{i}'}
+            for i in range(6)
+        ])
+
+        with self.assertRaises(ValidationError):
+            self.Prestamo.create([
+                {'libro_id': libro.id, 'miembro_id': miembro.id}
+                for libro in libros
+            ])
+
+    def test_devolucion_por_escaneo(self):
+        """
+        Test: Devolver un carrito de libros escaneados en una sola llamada.
+        """
+        partner = self.Partner.create({'name': 'Carrito Devolucion'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libros = self.Libro.create([
+            {'name': 'Escaneo ISBN', 'isbn': '7777777777771'},
+            {'name': 'Escaneo ID', 'isbn': '7777777777772'},
+        ])
+        prestamos = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': miembro.id}
+            for libro in libros
+        ])
+
+        resultado = self.Prestamo._devolver_por_escaneo([
+            '777-7777777-77-1',     # ISBN con guiones
+            str(libros[1].id),      # ID de libro
+            '0000000000000',        # No existe
+            '7777777777771',        # Mismo libro, escaneado otra vez sin guiones
+        ])
+
+        self.assertEqual(resultado['prestamos'], prestamos)
+        self.assertEqual(resultado['no_encontrados'], ['0000000000000'])
+        self.assertEqual(resultado['repetidos'], ['7777777777771'])
+        self.assertEqual(set(prestamos.mapped('estado')), {'devuelto'})
+        self.assertEqual(set(libros.mapped('estado')), {'disponible'})
+
+    def test_devolucion_por_escaneo_isbn_editado(self):
+        """
+        Test: un ISBN cargado con guiones al editar el libro se guarda
+        normalizado y el libro se devuelve al escanearlo.
+        """
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({'name': 'Escaneo Editado'}).id,
+        })
+        libro = self.Libro.create({'name': 'ISBN Editado'})
+        libro.write({'isbn': '252-5252525-25-1'})
+        self.assertEqual(libro.isbn, '2525252525251')
+        prestamo = self.Prestamo.create({'libro_id': libro.id, 'miembro_id': miembro.id})
+
+        resultado = self.Prestamo._devolver_por_escaneo(['2525252525251'])
+
+        self.assertEqual(resultado['prestamos'], prestamo)
+        self.assertFalse(resultado['no_encontrados'])
+
+    def test_cron_vencidos_por_lotes(self):
+        """
+        Test: El cron de vencidos procesa por lotes y reporta el resumen.
+        """
+        partner = self.Partner.create({'name': 'Cron Vencidos'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libros = self.Libro.create([
+            {'name': f'Libro Vencido {i}', 'isbn': f'888888888888{i}'}
+            for i in range(3)
+        ])
+        prestamos = self.Prestamo.create([
+            {
+                'libro_id': libro.id,
+                'miembro_id': miembro.id,
+                'fecha_prestamo': date.today() - timedelta(days=30),
+            }
+            for libro in libros
+        ])
+
+        resumen = self.Prestamo._cron_actualizar_vencidos(tamano_lote=2)
+
+        self.assertTrue(resumen['completo'])
+        self.assertGreaterEqual(resumen['procesados'], 3)
+        self.assertEqual(set(prestamos.mapped('estado')), {'vencido'})
+
+    def test_dias_retraso_almacenado(self):
+        """
+        Test: dias_retraso se guarda en BD y el refresco diario lo actualiza.
+        """
+        partner = self.Partner.create({'name': 'Retraso Almacenado'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libro = self.Libro.create({'name': 'Libro Atrasado', 'isbn': '9999999999991'})
+        prestamo = self.Prestamo.create({
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+            'fecha_prestamo': date.today() - timedelta(days=20),
+            'dias_prestamo': 14,
+        })
+        self.assertEqual(prestamo.dias_retraso, 6)
+
+        # Simular un valor desactualizado (como si hubiera pasado un día)
+        self.env.flush_all()
+        self.env.cr.execute(
+            'UPDATE biblioteca_prestamo SET dias_retraso = 5 WHERE id = %s', [prestamo.id])
+        prestamo.invalidate_recordset(['dias_retraso'])
+
+        actualizados = self.Prestamo._actualizar_dias_retraso()
+        self.assertGreaterEqual(actualizados, 1)
+        self.assertEqual(prestamo.dias_retraso, 6)
+
+        # Se puede buscar y ordenar en SQL
+        mas_atrasado = self.Prestamo.search(
+            [('dias_retraso', '>', 0)], order='dias_retraso desc', limit=1)
+        self.assertGreaterEqual(mas_atrasado.dias_retraso, 6)
+
+    def test_copias_sincronizadas_en_diferido(self):
+        """
+        Test: Renombrar un libro no reescribe los préstamos en el momento;
+        el cron de copias los actualiza después.
+        """
+        partner = self.Partner.create({'name': 'Copias Diferidas'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libro = self.Libro.create({'name': 'Título Viejo', 'isbn': '1212121212121'})
+        prestamo = self.Prestamo.create({
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+        })
+        self.assertEqual(prestamo.libro_titulo, 'Título Viejo')
+
+        libro.name = 'Título Nuevo'
+        partner.name = 'Copias Renombrado'
+        self.assertTrue(libro.copias_pendientes)
+        self.assertEqual(prestamo.libro_titulo, 'Título Viejo')
+
+        self.Prestamo._cron_sincronizar_copias()
+
+        self.assertFalse(libro.copias_pendientes)
+        self.assertEqual(prestamo.libro_titulo, 'Título Nuevo')
+        self.assertEqual(prestamo.miembro_nombre, 'Copias Renombrado')
+        self.assertIn(prestamo, self.Prestamo.search([('libro_titulo', '=', 'Título Nuevo')]))
+
+    def test_archivar_historial(self):
+        """
+        Test: Los préstamos devueltos antiguos pasan al historial y
+        siguen contando en el reporte y en el total del libro.
+        """
+        partner = self.Partner.create({'name': 'Historial'})
+        miembro = self.Miembro.create({'partner_id': partner.id})
+        libro = self.Libro.create({'name': 'Libro Historial', 'isbn': '1313131313131'})
+        prestamo = self.Prestamo.create({
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+            'fecha_prestamo': date.today() - timedelta(days=800),
+        })
+        prestamo.action_devolver()
+        prestamo.fecha_devolucion_real = date.today() - timedelta(days=780)
+
+        movidos = self.env['biblioteca.prestamo.historico']._cron_archivar_prestamos()
+
+        self.assertGreaterEqual(movidos, 1)
+        self.assertFalse(prestamo.exists())
+        historico = self.env['biblioteca.prestamo.historico'].search([
+            ('libro_id', '=', libro.id),
+        ])
+        self.assertEqual(historico.libro_titulo, 'Libro Historial')
+        self.assertEqual(
+            self.env['biblioteca.prestamo.reporte'].search_count([('libro_id', '=', libro.id)]), 1)
+
+        libro.invalidate_recordset(['prestamo_count'])
+        self.assertEqual(libro.prestamo_count, 1)
+
+    def _bloquear_desde_otro_puesto(self, libro):
+        """Toma el bloqueo de la fila del libro desde otra conexión (otro mostrador)."""
+        otro_cr = db_connect(self.env.cr.dbname).cursor()
+        self.addCleanup(otro_cr.close)
+        self.addCleanup(otro_cr.rollback)
+        otro_cr.execute('SELECT id FROM biblioteca_libro WHERE id = %s FOR UPDATE', [libro.id])
+        return otro_cr
+
+    def test_bloqueo_rechazado(self):
+        """
+        Test: si otro puesto retiene el libro, se reintenta con NOWAIT y
+        al agotar los reintentos se rechaza el préstamo y se registra.
+        """
+        # Libro de los datos del módulo: ya confirmado, visible para la otra conexión
+        libro = self.env.ref('tutorial_01_basico.libro_quijote')
+        self._bloquear_desde_otro_puesto(libro)
+
+        registrados = []
+        Prestamo = type(self.Prestamo)
+        with patch.object(Prestamo, '_registrar_bloqueo', lambda self_, c: registrados.append(dict(c))), \
+                patch('odoo.addons.tutorial_02_relaciones.models.prestamo.time.sleep') as espera, \
+                self.assertRaises(UserError):
+            self.Prestamo._bloquear_libros([libro.id])
+
+        self.assertEqual(espera.call_count, 3)
+        self.assertEqual(registrados, [{'conflictos': 4, 'reintentos': 3, 'fallidos': 1}])
+
+    def test_bloqueo_reintento_exitoso(self):
+        """
+        Test: si el otro puesto libera el libro durante la espera, el
+        reintento lo bloquea y el conflicto queda en las estadísticas.
+        """
+        libro = self.env.ref('tutorial_01_basico.libro_rayuela')
+        otro_cr = self._bloquear_desde_otro_puesto(libro)
+        antes = self.Prestamo._estadisticas_bloqueo()
+
+        with patch('odoo.addons.tutorial_02_relaciones.models.prestamo.time.sleep',
+                   side_effect=lambda _segundos: otro_cr.rollback()):
+            self.Prestamo._bloquear_libros([libro.id])
+
+        despues = self.Prestamo._estadisticas_bloqueo()
+        self.assertEqual(despues['conflictos'] - antes['conflictos'], 1)
+        self.assertEqual(despues['reintentos'] - antes['reintentos'], 1)
+        self.assertEqual(despues['fallidos'], antes['fallidos'])
+
+    def test_calculo_multas(self):
+        """
+        Test: las multas se calculan por regla de membresía y el saldo
+        del miembro solo cambia con la diferencia.
+        """
+        Regla = self.env['biblioteca.membresia.regla']
+        regla = Regla.search([('tipo_membresia', '=', 'premium')]) or Regla.create({
+            'tipo_membresia': 'premium',
+        })
+        regla.write({'tarifa_diaria': 2.0, 'dias_gracia': 1, 'multa_maxima': 7.0})
+
+        partner = self.Partner.create({'name': 'Miembro con Multa'})
+        miembro = self.Miembro.create({
+            'partner_id': partner.id,
+            'tipo_membresia': 'premium',
+        })
+        libros = self.Libro.create([
+            {'name': 'Multa Corta', 'isbn': '1414141414141'},
+            {'name': 'Multa con Tope', 'isbn': '1414141414142'},
+        ])
+        corto, largo = self.Prestamo.create([{
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+            'fecha_prestamo': date.today() - timedelta(days=dias),
+            'dias_prestamo': 14,
+        } for libro, dias in zip(libros, (17, 20))])
+
+        self.Prestamo._calcular_multas()
+        # 3 días de retraso - 1 de gracia = 2 días * 2.0
+        self.assertEqual(corto.multa, 4.0)
+        # 6 días - 1 = 5 días * 2.0 = 10.0, limitado por el tope
+        self.assertEqual(largo.multa, 7.0)
+        self.assertEqual(miembro.saldo_multas, 11.0)
+
+        # Sin cambios: no se vuelve a sumar al saldo
+        self.assertEqual(self.Prestamo._calcular_multas(), 0)
+        self.assertEqual(miembro.saldo_multas, 11.0)
+
+        # Una multa cerrada no cambia aunque después cambie la regla
+        corto.action_devolver()
+        regla.tarifa_diaria = 3.0
+        self.Prestamo._calcular_multas()
+        self.assertEqual(corto.multa, 4.0)
+        self.assertEqual(largo.multa, 7.0)
+        self.assertEqual(miembro.saldo_multas, 11.0)
+
+        miembro.action_saldar_multas()
+        self.assertEqual(miembro.saldo_multas, 0.0)
+
+    def test_cola_de_reservas(self):
+        """
+        Test: al devolver un libro, la reserva más antigua pasa a estar
+        lista para retirar y el libro queda reservado para ese miembro.
+        """
+        Reserva = self.env['biblioteca.reserva']
+        ana, beto, carla = self.Miembro.create([
+            {'partner_id': self.Partner.create({'name': nombre}).id}
+            for nombre in ('Reserva Ana', 'Reserva Beto', 'Reserva Carla')
+        ])
+        libro = self.Libro.create({'name': 'Libro en Cola', 'isbn': '1515151515151'})
+        prestamo = self.Prestamo.create({'libro_id': libro.id, 'miembro_id': ana.id})
+        reserva_beto, reserva_carla = Reserva.create([
+            {'libro_id': libro.id, 'miembro_id': beto.id},
+            {'libro_id': libro.id, 'miembro_id': carla.id},
+        ])
+        self.assertEqual(reserva_beto.estado, 'espera')
+
+        prestamo.action_devolver()
+        self.assertEqual(libro.estado, 'reservado')
+        self.assertEqual(reserva_beto.estado, 'disponible')
+        self.assertTrue(reserva_beto.fecha_limite)
+        self.assertEqual(reserva_carla.estado, 'espera')
+
+        # Solo el primero de la cola puede retirarlo
+        with self.assertRaises(ValidationError):
+            self.Prestamo.create({'libro_id': libro.id, 'miembro_id': carla.id})
+        prestamo_beto = self.Prestamo.create({'libro_id': libro.id, 'miembro_id': beto.id})
+        self.assertEqual(reserva_beto.estado, 'cumplida')
+
+        # Carla no retira a tiempo: su reserva vence y el libro se libera
+        prestamo_beto.action_devolver()
+        self.assertEqual(reserva_carla.estado, 'disponible')
+        reserva_carla.write({'fecha_limite': date.today() - timedelta(days=1)})
+        self.assertEqual(Reserva._cron_vencer_reservas(), 1)
+        self.assertEqual(reserva_carla.estado, 'vencida')
+        self.assertEqual(libro.estado, 'disponible')
+
+    def test_retirar_reserva_desde_formulario(self):
+        """
+        Test: el miembro de la reserva lista puede retirar el libro desde
+        la interfaz (botón Nuevo Préstamo y dominio del campo libro).
+        """
+        ana, beto = self.Miembro.create([
+            {'partner_id': self.Partner.create({'name': nombre}).id}
+            for nombre in ('Retiro Ana', 'Retiro Beto')
+        ])
+        libro = self.Libro.create({'name': 'Libro para Retirar', 'isbn': '2222222222221'})
+        prestamo = self.Prestamo.create({'libro_id': libro.id, 'miembro_id': ana.id})
+        reserva = self.env['biblioteca.reserva'].create({'libro_id': libro.id, 'miembro_id': beto.id})
+        prestamo.action_devolver()
+        self.assertEqual(libro.estado, 'reservado')
+
+        # El libro aparece en el selector solo para el miembro de la reserva
+        dominio = self.Prestamo._fields['libro_id'].domain
+        self.assertIn(libro, self.Libro.search(safe_eval(dominio, {'miembro_id': beto.id})))
+        self.assertNotIn(libro, self.Libro.search(safe_eval(dominio, {'miembro_id': ana.id})))
+
+        accion = libro.action_crear_prestamo()
+        self.assertEqual(accion['context']['default_miembro_id'], beto.id)
+        with Form(self.Prestamo.with_context(accion['context'])) as formulario:
+            self.assertEqual(formulario.libro_id, libro)
+        self.assertEqual(formulario.record.miembro_id, beto)
+        self.assertEqual(reserva.estado, 'cumplida')
+        self.assertEqual(libro.estado, 'prestado')
+
+    def test_recordatorios_agrupados(self):
+        """
+        Test: cada miembro recibe un único recordatorio con todos sus
+        préstamos por vencer o vencidos, y no se repite al día siguiente.
+        """
+        self.env['ir.config_parameter'].sudo().set_param(
+            'tutorial_02_relaciones.recordatorios_destino', 'registro')
+        Recordatorio = self.env['biblioteca.recordatorio']
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({
+                'name': 'Miembro Avisado', 'email': 'avisado@example.com'}).id,
+        })
+        libros = self.Libro.create([
+            {'name': f'Recordatorio {i}', 'isbn': f'161616161616{i}'} for i in range(3)
+        ])
+        por_vencer, vencido, lejano = self.Prestamo.create([{
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+            'fecha_prestamo': date.today() - timedelta(days=dias),
+            'dias_prestamo': 14,
+        } for libro, dias in zip(libros, (13, 20, 0))])
+
+        self.assertGreaterEqual(self.Prestamo._cron_enviar_recordatorios(), 1)
+        recordatorio = Recordatorio.search([('miembro_id', '=', miembro.id)])
+        self.assertEqual(len(recordatorio), 1)
+        self.assertEqual(recordatorio.prestamo_ids, por_vencer | vencido)
+        self.assertEqual(recordatorio.email_to, 'avisado@example.com')
+        self.assertIn('Recordatorio 1', recordatorio.cuerpo)
+        self.assertFalse(lejano.ultimo_recordatorio)
+
+        # Ya avisados hoy: no se vuelve a enviar
+        self.Prestamo._cron_enviar_recordatorios()
+        self.assertEqual(Recordatorio.search_count([('miembro_id', '=', miembro.id)]), 1)
+
+    def test_renovacion_en_lote(self):
+        """
+        Test: la renovación en lote decide la elegibilidad de todos los
+        préstamos a la vez y devuelve el resultado de cada uno.
+        """
+        miembro, otro = self.Miembro.create([
+            {'partner_id': self.Partner.create({'name': nombre}).id}
+            for nombre in ('Renueva Todo', 'Quiere Reservar')
+        ])
+        libros = self.Libro.create([
+            {'name': f'Renovable {i}', 'isbn': f'171717171717{i}'} for i in range(4)
+        ])
+        renovable, reservado, al_limite, atrasado = self.Prestamo.create([{
+            'libro_id': libro.id,
+            'miembro_id': miembro.id,
+            'fecha_prestamo': date.today() - timedelta(days=dias),
+        } for libro, dias in zip(libros, (5, 5, 5, 20))])
+        al_limite.write({'renovaciones': 5})
+        self.env['biblioteca.reserva'].create({
+            'libro_id': reservado.libro_id.id,
+            'miembro_id': otro.id,
+        })
+
+        prestamos = renovable | reservado | al_limite | atrasado
+        resultado = prestamos._renovar_en_lote()
+        self.assertEqual(resultado, {
+            renovable.id: 'renovado',
+            reservado.id: 'reservado',
+            al_limite.id: 'limite',
+            atrasado.id: 'con_retraso',
+        })
+        self.assertEqual(renovable.renovaciones, 1)
+        self.assertEqual(renovable.fecha_devolucion_esperada, date.today() + timedelta(days=14))
+        self.assertEqual(reservado.renovaciones, 0)
+
+        # Renovar uno por uno sigue avisando el motivo
+        with self.assertRaises(UserError):
+            reservado.action_renovar()
+
+    def test_contadores_miembro(self):
+        """
+        Test: los contadores del miembro se ajustan al prestar, devolver y
+        eliminar, y la reconstrucción obtiene los mismos valores.
+        """
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({'name': 'Miembro Contado'}).id,
+        })
+        libros = self.Libro.create([
+            {'name': f'Contado {i}', 'isbn': f'181818181818{i}'} for i in range(3)
+        ])
+        prestamos = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': miembro.id} for libro in libros
+        ])
+        self.assertEqual((miembro.prestamo_count, miembro.prestamos_activos), (3, 3))
+
+        prestamos[:2].action_devolver()
+        self.assertEqual((miembro.prestamo_count, miembro.prestamos_activos), (3, 1))
+
+        prestamos[0].unlink()
+        self.assertEqual((miembro.prestamo_count, miembro.prestamos_activos), (2, 1))
+
+        # Valores corruptos: la reconstrucción los corrige
+        self.env.cr.execute(
+            'UPDATE biblioteca_miembro SET prestamo_count = 99, prestamos_activos = 99 WHERE id = %s',
+            [miembro.id])
+        self.Miembro._reconstruir_contadores(miembro)
+        self.assertEqual((miembro.prestamo_count, miembro.prestamos_activos), (2, 1))
+        self.assertIn(miembro, self.Miembro.search([('prestamos_activos', '>', 0)]))
+
+    def test_contadores_nulos_en_init(self):
+        """
+        Test: al actualizar el módulo, init() calcula los contadores de los
+        miembros que aún no los tienen (NULL).
+        """
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({'name': 'Miembro sin Contadores'}).id,
+        })
+        libros = self.Libro.create([
+            {'name': f'Sin Contar {i}', 'isbn': f'232323232323{i}'} for i in range(2)
+        ])
+        prestamos = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': miembro.id} for libro in libros
+        ])
+        prestamos[0].action_devolver()
+        self.env.flush_all()
+        self.env.cr.execute(
+            'UPDATE biblioteca_miembro SET prestamo_count = NULL, prestamos_activos = NULL WHERE id = %s',
+            [miembro.id])
+        self.Miembro.invalidate_model(['prestamo_count', 'prestamos_activos'])
+
+        self.Miembro.init()
+
+        self.assertEqual((miembro.prestamo_count, miembro.prestamos_activos), (2, 1))
+
+    def test_limite_por_tipo_membresia(self):
+        """
+        Test: el límite de préstamos depende del tipo de membresía y también
+        se aplica al pasar un préstamo a otro miembro.
+        """
+        Regla = self.env['biblioteca.membresia.regla']
+        for tipo, limite in (('basica', 1), ('vip', 3)):
+            regla = Regla.search([('tipo_membresia', '=', tipo)]) or Regla.create({'tipo_membresia': tipo})
+            regla.max_prestamos_activos = limite
+        basico, vip = self.Miembro.create([
+            {'partner_id': self.Partner.create({'name': nombre}).id, 'tipo_membresia': tipo}
+            for nombre, tipo in (('Límite Básico', 'basica'), ('Límite VIP', 'vip'))
+        ])
+        libros = self.Libro.create([
+            {'name': f'Límite Tipo {i}', 'isbn': f'191919191919{i}'} for i in range(3)
+        ])
+
+        self.Prestamo.create({'libro_id': libros[0].id, 'miembro_id': basico.id})
+        with self.assertRaises(ValidationError):
+            self.Prestamo.create({'libro_id': libros[1].id, 'miembro_id': basico.id})
+
+        prestamos_vip = self.Prestamo.create([
+            {'libro_id': libro.id, 'miembro_id': vip.id} for libro in libros[1:]
+        ])
+        self.assertEqual(vip.prestamos_activos, 2)
+
+        with self.assertRaises(ValidationError):
+            prestamos_vip[0].write({'miembro_id': basico.id})
+
+    def test_carnets_en_bloque(self):
+        """
+        Test: al registrar muchos miembros juntos los carnets se reservan
+        en bloque, consecutivos y con el formato de la secuencia.
+        """
+        partners = self.Partner.create([{'name': f'Alumno {i}'} for i in range(5)])
+        miembros = self.Miembro.create([{'partner_id': p.id} for p in partners])
+
+        carnets = miembros.mapped('numero_carnet')
+        self.assertEqual(len(set(carnets)), 5)
+        self.assertTrue(all(c.startswith('MBR-') for c in carnets))
+        numeros = [int(c[len('MBR-'):]) for c in carnets]
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + 5)))
+
+        # Sin secuencia no se inventan carnets repetidos
+        self.env['ir.sequence'].search([('code', '=', 'biblioteca.miembro.carnet')]).active = False
+        with self.assertRaises(UserError):
+            self.Miembro.create([
+                {'partner_id': self.Partner.create({'name': f'Sin Carnet {i}'}).id}
+                for i in range(2)
+            ])
+
+    def test_inscripcion_masiva(self):
+        """
+        Test: la inscripción masiva omite a los contactos que ya son
+        miembros en lugar de fallar por partner_unique.
+        """
+        partners = self.Partner.create([
+            {'name': f'Padrón {i}', 'email': f'padron{i}@example.com'} for i in range(3)
+        ])
+        self.Miembro.create({'partner_id': partners[0].id})
+
+        Inscripcion = self.env['biblioteca.inscripcion.lote']
+        resultado = Inscripcion._inscribir([('id', 'in', partners.ids)], 'premium')
+        self.assertEqual(resultado, {'creados': 2, 'omitidos': 1})
+        nuevos = self.Miembro.search([('partner_id', 'in', partners[1:].ids)])
+        self.assertEqual(nuevos.mapped('tipo_membresia'), ['premium', 'premium'])
+
+        # Desde CSV por email (sin distinguir mayúsculas)
+        otro = self.Partner.create({'name': 'Padrón CSV', 'email': 'csv@example.com'})
+        asistente = Inscripcion.create({
+            'origen': 'csv',
+            'archivo': base64.b64encode(b'email\nCSV@example.com\nnadie@example.com\n'),
+        })
+        asistente.action_inscribir()
+        self.assertEqual((asistente.creados, asistente.omitidos), (1, 0))
+        self.assertEqual(asistente.no_encontrados, 'nadie@example.com')
+        self.assertTrue(self.Miembro.search([('partner_id', '=', otro.id)]))
+
+    def test_membresia_vencida(self):
+        """
+        Test: el cron desactiva las membresías vencidas y no se puede
+        prestar a un miembro vencido hasta que renueve.
+        """
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({'name': 'Membresía Vencida'}).id,
+            'fecha_registro': date.today() - timedelta(days=400),
+        })
+        libro = self.Libro.create({'name': 'Libro para Vencido', 'isbn': '2020202020201'})
+
+        with self.assertRaises(ValidationError):
+            self.Prestamo.create({'libro_id': libro.id, 'miembro_id': miembro.id})
+
+        self.assertGreaterEqual(self.Miembro._cron_desactivar_vencidos(), 1)
+        self.assertFalse(miembro.activo)
+
+        miembro.action_renovar_membresia()
+        self.assertTrue(miembro.activo)
+        self.assertGreater(miembro.fecha_vencimiento, date.today())
+        self.Prestamo.create({'libro_id': libro.id, 'miembro_id': miembro.id})
+        self.assertEqual(libro.estado, 'prestado')
+
+    def test_busqueda_por_escaneo(self):
+        """
+        Test: el mostrador identifica al miembro por carnet, email o
+        teléfono y recibe sus préstamos y el estado del límite.
+        """
+        miembro = self.Miembro.create({
+            'partner_id': self.Partner.create({
+                'name': 'Miembro Escaneado',
+                'email': 'Escaneo@Example.com',
+                'phone': '+54 (11) 5555-0101',
+            }).id,
+        })
+        libro = self.Libro.create({'name': 'Libro Escaneado', 'isbn': '2121212121211'})
+        self.Prestamo.create({'libro_id': libro.id, 'miembro_id': miembro.id})
+
+        for codigo in (miembro.numero_carnet.lower(), 'escaneo@example.com ', '5411 5555 0101'):
+            resultado = self.Miembro._buscar_por_escaneo(codigo)
+            self.assertTrue(resultado['encontrado'], codigo)
+            self.assertEqual(resultado['miembro']['id'], miembro.id)
+
+        self.assertEqual([p['libro_id'] for p in resultado['prestamos']], [libro.id])
+        self.assertEqual(resultado['limite']['prestamos_activos'], 1)
+        self.assertTrue(resultado['limite']['puede_prestar'])
+        self.assertFalse(self.Miembro._buscar_por_escaneo('no-existe')['encontrado'])
+
+    def test_conteo_libros_por_categoria(self):
+        """
+        Test: la cantidad de libros se calcula para varias categorías
+        con una consulta agrupada.
+        """
+        Categoria = self.env['biblioteca.categoria']
+        historia, ciencia, vacia = Categoria.create([
+            {'name': 'Conteo Historia'}, {'name': 'Conteo Ciencia'}, {'name': 'Conteo Vacía'},
+        ])
+        self.Libro.create([
+            {'name': 'Conteo 1', 'categoria_ids': [Command.set([historia.id, ciencia.id])]},
+            {'name': 'Conteo 2', 'categoria_ids': [Command.set([historia.id])]},
+        ])
+        categorias = historia | ciencia | vacia
+        categorias.invalidate_recordset(['libro_count'])
+        self.assertEqual(categorias.mapped('libro_count'), [2, 1, 0])
+
+    def test_categorias_jerarquicas(self):
+        """
+        Test: child_of encuentra los libros de todo el subárbol y el
+        conteo total los agrega sin repetir libros.
+        """
+        Categoria = self.env['biblioteca.categoria']
+        literatura = Categoria.create({'name': 'Árbol Literatura'})
+        latinoamericana = Categoria.create({'name': 'Latinoamericana', 'parent_id': literatura.id})
+        argentina = Categoria.create({'name': 'Argentina', 'parent_id': latinoamericana.id})
+        self.assertEqual(argentina.complete_name, 'Árbol Literatura / Latinoamericana / Argentina')
+
+        libros = self.Libro.create([
+            {'name': 'Árbol 1', 'categoria_ids': [Command.set([argentina.id])]},
+            {'name': 'Árbol 2', 'categoria_ids': [Command.set([latinoamericana.id, argentina.id])]},
+            {'name': 'Árbol 3', 'categoria_ids': [Command.set([literatura.id])]},
+        ])
+        self.assertEqual(
+            self.Libro.search([('categoria_ids', 'child_of', latinoamericana.id)]),
+            libros[:2],
+        )
+        categorias = literatura | latinoamericana | argentina
+        categorias.invalidate_recordset(['libro_count_total'])
+        self.assertEqual(categorias.mapped('libro_count_total'), [3, 2, 2])
+
+        with self.assertRaises(ValidationError):
+            literatura.parent_id = argentina
+
+    def test_busqueda_facetada(self):
+        """
+        Test: la búsqueda facetada devuelve la página y los conteos de
+        cada faceta calculados sobre todo el resultado, no solo la página.
+        """
+        categoria = self.env['biblioteca.categoria'].create({'name': 'Facetas'})
+        self.Libro.create([
+            {'name': 'Faceta 1', 'editorial': 'Sur', 'fecha_publicacion': '1995-03-01',
+             'categoria_ids': [Command.set([categoria.id])]},
+            {'name': 'Faceta 2', 'editorial': 'Sur', 'fecha_publicacion': '1999-12-31',
+             'categoria_ids': [Command.set([categoria.id])]},
+            {'name': 'Faceta 3', 'editorial': 'Emecé', 'fecha_publicacion': '2001-06-15'},
+        ])
+
+        resultado = self.Libro._buscar_con_facetas(
+            [('name', '=like', 'Faceta %')], limit=2, order='name')
+
+        self.assertEqual(resultado['total'], 3)
+        self.assertEqual(resultado['libros'].mapped('name'), ['Faceta 1', 'Faceta 2'])
+        facetas = resultado['facetas']
+        self.assertEqual(facetas['editorial'][0], {'valor': 'Sur', 'cantidad': 2})
+        self.assertEqual(
+            {f['valor']: f['cantidad'] for f in facetas['decada']}, {1990: 2, 2000: 1})
+        self.assertEqual(facetas['categoria'][0]['valor'], categoria.id)
+        self.assertEqual(facetas['categoria'][0]['cantidad'], 2)
+        self.assertEqual(facetas['disponible'], [{'valor': True, 'cantidad': 3}])